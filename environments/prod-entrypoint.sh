@@ -5,4 +5,10 @@ python manage.py makemigrations
 python manage.py migrate
 python manage.py collectstatic --noinput
 
+# Remove metrics of the previous server run
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 exec "$@"
@@ -0,0 +1 @@
+default_app_config = 'ticketonline.apps.events.apps.EventsConfig'
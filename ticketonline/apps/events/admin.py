@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Event, Reservation
+from .models import Event, Reservation, WaitingRoom
 
 # Register your models here.
 admin.site.register(Event)
 admin.site.register(Reservation)
+admin.site.register(WaitingRoom)
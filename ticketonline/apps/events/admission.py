@@ -0,0 +1,119 @@
+import math
+import time
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DateTimeField, F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from .models import WaitingRoom
+
+QUEUE_TOKEN_SALT = 'ticketonline.waiting-room'
+
+
+class InvalidQueueToken(Exception):
+    pass
+
+
+def issue_queue_token(event_id):
+    """
+    Function puts a new user at the end of the event waiting room.
+    Every token gets its own admission time (slot) which is 1 / admission_rate seconds after the slot of the previous
+    token, so the tokens are admitted in the order they were issued at the configured rate.
+    When the queue is empty, up to burst tokens are admitted at once.
+    :param event_id: id of the event with a waiting room
+    :return: queue token (string)
+    """
+    waiting_room = WaitingRoom.objects.only('admission_rate', 'burst').get(event_id=event_id)
+
+    # Slots of the first burst tokens issued to an empty queue are not later than now
+    interval = timedelta(seconds=1 / waiting_room.admission_rate)
+    earliest_slot = Value(timezone.now() - interval * max(waiting_room.burst - 1, 0), output_field=DateTimeField())
+
+    with transaction.atomic():
+        # Move the next slot with a single UPDATE, so concurrent users wait only for this statement
+        # and read the slot they got before other users can change it
+        WaitingRoom.objects.filter(event_id=event_id).update(
+            next_slot=Greatest(Coalesce('next_slot', earliest_slot), earliest_slot) + interval,
+            issued=F('issued') + 1)
+        slot = WaitingRoom.objects.filter(event_id=event_id).values_list('next_slot', flat=True).get() - interval
+
+    return signing.dumps({
+        'event_id': str(event_id),
+        'slot': slot.timestamp(),
+        'rate': waiting_room.admission_rate,
+        'nonce': uuid.uuid4().hex,
+    }, salt=QUEUE_TOKEN_SALT)
+
+
+def queue_token_status(token):
+    """
+    Function reads the state of the queue token. It does not need to query the database or the cache.
+    :param token: queue token returned by issue_queue_token
+    :return: dictionary with:
+        - event_id - id of the event the token was issued for
+        - admitted - whether the token can be used to make a reservation
+        - expired - whether the time to use admitted token has passed
+        - position - approximate amount of users in the queue ahead of the token holder
+        - estimated_wait - seconds left to admission
+    :raises InvalidQueueToken: when the token was not issued by the server
+    """
+    try:
+        data = signing.loads(token, salt=QUEUE_TOKEN_SALT)
+    except signing.BadSignature:
+        raise InvalidQueueToken("Queue token is not valid")
+
+    now = time.time()
+    estimated_wait = max(data['slot'] - now, 0)
+
+    return {
+        "event_id": data['event_id'],
+        "nonce": data['nonce'],
+        "admitted": estimated_wait == 0,
+        "expired": now > data['slot'] + settings.WAITING_ROOM_TOKEN_TIMEOUT,
+        "position": math.ceil(estimated_wait * data['rate']),
+        "estimated_wait": round(estimated_wait, 1),
+    }
+
+
+def admit_queue_token(token, event_id):
+    """
+    Function checks if the queue token admits its holder to make a reservation for the event and claims the token.
+    Every token can be used only once - it has to be released with release_queue_token if the reservation fails.
+    :param token: queue token returned by issue_queue_token
+    :param event_id: id of the event the reservation is made for
+    :return: nonce of the claimed token
+    :raises InvalidQueueToken: when the token does not admit a reservation, with the reason as an argument
+    """
+    if not token:
+        raise InvalidQueueToken("This event requires a queue token to make a reservation")
+
+    status = queue_token_status(token)
+    if status['event_id'] != str(event_id):
+        raise InvalidQueueToken("Queue token was issued for a different event")
+    if not status['admitted']:
+        raise InvalidQueueToken(f"Queue token is not admitted yet. Estimated wait: {status['estimated_wait']}s")
+    if status['expired']:
+        raise InvalidQueueToken("Queue token has expired")
+
+    # Claim the token, so it can not be used by concurrent requests
+    if not cache.add(queue_token_cache_key(status['nonce']), True, settings.WAITING_ROOM_TOKEN_TIMEOUT):
+        raise InvalidQueueToken("Queue token has already been used")
+
+    return status['nonce']
+
+
+def release_queue_token(nonce):
+    """
+    Function gives back the token claimed by admit_queue_token when the reservation was not made,
+    so the user can try again without queueing once more.
+    :param nonce: value returned by admit_queue_token
+    """
+    cache.delete(queue_token_cache_key(nonce))
+
+
+def queue_token_cache_key(nonce):
+    return f"waiting-room-token:{nonce}"
@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class EventsConfig(AppConfig):
-    name = 'events'
+    name = 'ticketonline.apps.events'
+    label = 'events'
+
+    def ready(self):
+        from . import signals
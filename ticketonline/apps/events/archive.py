@@ -0,0 +1,82 @@
+import gzip
+import json
+import os
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from .models import Reservation
+from ticketonline.apps.tickets.models import OrderedTicket
+from ticketonline.apps.payments.models import Transaction
+
+
+def archive_file_name(first_reservation):
+    """
+    Function returns the name of the archive file for the chunk starting with given reservation.
+    The name depends on the first reservation only, so a chunk archived again after an interrupted run
+    overwrites its previous file instead of creating a duplicate.
+    """
+    return f"reservations-{first_reservation['reservation_date']:%Y%m%d%H%M%S}-{first_reservation['id']}.jsonl.gz"
+
+
+def write_archive(path, reservations):
+    """
+    Function writes reservations to a compressed JSONL file - one reservation per line.
+    The file is written under a temporary name first and renamed when complete.
+    """
+    temporary_path = f"{path}.tmp"
+    with gzip.open(temporary_path, 'wt', encoding='utf-8') as archive:
+        for reservation in reservations:
+            archive.write(json.dumps(reservation, cls=DjangoJSONEncoder) + '\n')
+
+    os.replace(temporary_path, path)
+
+
+def archive_reservations(older_than, archive_dir, chunk_size):
+    """
+    Function moves reservations made before given date, along with their tickets and transactions,
+    to compressed archive files and removes them from the database.
+    Reservations are processed in chunks ordered by reservation date. Every chunk is written to its own file
+    and then deleted in a short transaction, so the process can be stopped and run again at any moment.
+    PENDING reservations are skipped as they still hold tickets.
+    :param older_than: datetime - reservations made before this date are archived
+    :param archive_dir: directory to store archive files in
+    :param chunk_size: amount of reservations archived at once
+    :return: amount of archived reservations
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    old_reservations = Reservation.objects.filter(reservation_date__lt=older_than).exclude(status='PENDING') \
+        .order_by('reservation_date', 'id')
+    archived = 0
+
+    while True:
+        # Get the oldest chunk of reservations
+        reservations = list(old_reservations.values()[:chunk_size])
+        if not reservations:
+            break
+
+        # Get tickets and transactions of all the reservations in the chunk at once
+        reservation_ids = [reservation['id'] for reservation in reservations]
+        tickets = OrderedTicket.objects.filter(reservation_id__in=reservation_ids).values()
+        transactions = Transaction.objects.filter(reservation_id__in=reservation_ids).values()
+
+        reservations_by_id = dict()
+        for reservation in reservations:
+            reservation['tickets'] = []
+            reservation['transactions'] = []
+            reservations_by_id[reservation['id']] = reservation
+        for ticket in tickets:
+            reservations_by_id[ticket['reservation_id']]['tickets'].append(ticket)
+        for reservation_transaction in transactions:
+            reservations_by_id[reservation_transaction['reservation_id']]['transactions'].append(
+                reservation_transaction)
+
+        write_archive(os.path.join(archive_dir, archive_file_name(reservations[0])), reservations)
+
+        # Remove archived chunk
+        with transaction.atomic():
+            OrderedTicket.objects.filter(reservation_id__in=reservation_ids).delete()
+            Transaction.objects.filter(reservation_id__in=reservation_ids).delete()
+            Reservation.objects.filter(id__in=reservation_ids).delete()
+
+        archived += len(reservations)
+
+    return archived
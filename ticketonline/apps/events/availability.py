@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import Sum
+from ticketonline.apps.tickets.models import TicketType
+from ticketonline.apps.tickets.serializers import ticket_type_row_serializer
+from .conditional import touch_events
+
+
+def availability_cache_key(event_id):
+    return f"event-availability:{event_id}"
+
+
+def get_ticket_availability(event_id):
+    """
+    Function returns all the ticket types of the event with amount of tickets left for each of them.
+    The result is shared between all the server processes through the cache and kept there for
+    AVAILABILITY_CACHE_TIMEOUT seconds at most, unless it is invalidated earlier by a reservation change.
+    Amounts read from a replica are not cached, because the replica can be behind the primary database
+    and the stale amounts would be served to all the clients, including the ones pinned to the primary database.
+    :param event_id: id of the event
+    :return: list of serialized ticket types with tickets_left value
+    """
+    key = availability_cache_key(event_id)
+    ticket_types = cache.get(key)
+
+    if ticket_types is None:
+        # Serialize all types of tickets and calculate amount of tickets left for each of them
+        # Reserved counters already contain tickets held by PENDING and COMPLETED reservations
+        ticket_types = ticket_type_row_serializer.serialize_many(
+            ticket_type_row_serializer.values(TicketType.objects.filter(event_id=event_id)))
+        for ticket in ticket_types:
+            ticket['tickets_left'] = ticket['amount'] - ticket['amount_reserved']
+
+        if router.db_for_read(TicketType) == 'default':
+            cache.set(key, ticket_types, settings.AVAILABILITY_CACHE_TIMEOUT)
+
+    return ticket_types
+
+
+def get_availability_summary(event_ids):
+    """
+    Function returns the summary of tickets left for every given event, e.g. to show "sold out" badges in the list.
+    All the events are summarized with one grouped query.
+    Statuses:
+    - AVAILABLE - there are tickets left
+    - FEW_LEFT - at most FEW_TICKETS_LEFT_RATIO part of all the tickets is left
+    - SOLD_OUT - there are no tickets left (or the event does not sell any tickets)
+    :param event_ids: list of ids of the events
+    :return: dictionary with event id (string) as a key and tickets_total, tickets_left and status as a value
+    """
+    totals = TicketType.objects.filter(event_id__in=event_ids).values('event_id') \
+        .annotate(amount=Sum('amount'), amount_reserved=Sum('amount_reserved')).order_by()
+    totals = {str(row['event_id']): row for row in totals}
+
+    summary = dict()
+    for event_id in map(str, event_ids):
+        row = totals.get(event_id, {'amount': 0, 'amount_reserved': 0})
+        tickets_left = row['amount'] - row['amount_reserved']
+
+        if tickets_left <= 0:
+            status = 'SOLD_OUT'
+        elif tickets_left <= row['amount'] * settings.FEW_TICKETS_LEFT_RATIO:
+            status = 'FEW_LEFT'
+        else:
+            status = 'AVAILABLE'
+
+        summary[event_id] = {"tickets_total": row['amount'], "tickets_left": max(tickets_left, 0), "status": status}
+
+    return summary
+
+
+def invalidate_ticket_availability(event_ids, touch=False):
+    """
+    Function removes cached amounts of tickets left for given events and optionally marks the events as changed.
+    When called inside a transaction, the cache is cleared once again after the transaction is committed
+    because other requests could cache the old values in the meantime. The cache is cleared before the events
+    are marked as changed, so the new version of the event is never served with the old amounts.
+    The events are marked as changed only after the commit, so concurrent reservations of the same event
+    do not wait for each other on the lock of the event row.
+    :param event_ids: list of ids of the events which reservations changed
+    :param touch: True if the availability of the events changed (a ticket type sold out, became available again
+        or the ticket types were changed), other changes of the amounts are picked up by the conditional requests
+        after AVAILABILITY_CACHE_TIMEOUT seconds
+    """
+    event_ids = set(event_ids)
+    keys = [availability_cache_key(event_id) for event_id in event_ids]
+    cache.delete_many(keys)
+
+    def after_commit():
+        cache.delete_many(keys)
+        if touch:
+            touch_events(event_ids)
+
+    transaction.on_commit(after_commit)
@@ -0,0 +1,82 @@
+import datetime
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, set_response_etag
+from .models import Event, Reservation
+
+
+def touch_events(event_ids):
+    """
+    Function marks given events as changed, so the clients holding their old responses get the new ones.
+    :param event_ids: list of ids of the events which changed
+    """
+    Event.objects.filter(id__in=set(event_ids)).update(version=F('version') + 1, modified=timezone.now())
+
+
+def get_event_state(request, event_id):
+    """
+    Function returns version and the moment of the last change of the event.
+    The state is read once per request, no matter how many times it is needed.
+    :return: dictionary with version and modified or None if the event does not exist
+    """
+    if not hasattr(request, 'event_state'):
+        request.event_state = Event.objects.filter(id=event_id).values('version', 'modified').first()
+    return request.event_state
+
+
+def availability_period():
+    """
+    Function returns the number of the current period of AVAILABILITY_CACHE_TIMEOUT seconds.
+    Amounts of tickets left and sold change with every reservation and payment, but the version of the event
+    changes only when a ticket type sells out or becomes available again. Responses with these amounts are
+    therefore considered changed in every period, so they are never older than the cached amounts of tickets left.
+    """
+    return int(timezone.now().timestamp()) // max(settings.AVAILABILITY_CACHE_TIMEOUT, 1)
+
+
+def event_etag(event_id, state, prefix):
+    return f'"{prefix}-{event_id}-{state["version"]}-{availability_period()}"' if state else None
+
+
+def event_last_modified(state):
+    if not state:
+        return None
+    period_start = datetime.datetime.fromtimestamp(
+        availability_period() * max(settings.AVAILABILITY_CACHE_TIMEOUT, 1), tz=datetime.timezone.utc)
+    return max(state['modified'], period_start)
+
+
+def event_detail_etag(request, pk=None):
+    return event_etag(pk, get_event_state(request, pk), 'event')
+
+
+def event_detail_last_modified(request, pk=None):
+    return event_last_modified(get_event_state(request, pk))
+
+
+def event_statistics_etag(request):
+    event_id = request.GET.get('event_id')
+    return event_etag(event_id, get_event_state(request, event_id), 'stats')
+
+
+def event_statistics_last_modified(request):
+    return event_last_modified(get_event_state(request, request.GET.get('event_id')))
+
+
+def reservation_etag(request):
+    """
+    Reservation detail changes together with the reservation status and the event data.
+    """
+    reservation_id = request.GET.get('reservation_id')
+    state = Reservation.objects.filter(id=reservation_id).values('status', 'event__version').first()
+    return f'"reservation-{reservation_id}-{state["status"]}-{state["event__version"]}"' if state else None
+
+
+def conditional_content_response(request, response):
+    """
+    Function sets the ETag computed from the content of the response and answers with 304 Not Modified
+    when the client already has the same content. Used for the responses which do not depend on a single event.
+    """
+    set_response_etag(response)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
@@ -0,0 +1,46 @@
+import datetime
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def parse_date_param(value, end_of_day=False):
+    """
+    Function reads the date or date and time given as a request param.
+    :param value: ISO 8601 date (2026-10-18) or date and time (2026-10-18T20:00:00+02:00)
+    :param end_of_day: whether a date without time means the end of the day instead of its beginning
+    :return: aware datetime or None if the param was not given
+    :raises ValueError: when the value is not a valid date
+    """
+    if not value:
+        return None
+
+    date_time = parse_datetime(value)
+    if date_time is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(f"{value} is not a valid date")
+        date_time = datetime.datetime.combine(date, datetime.time.max if end_of_day else datetime.time.min)
+
+    if timezone.is_naive(date_time):
+        date_time = timezone.make_aware(date_time)
+    return date_time
+
+
+def filter_upcoming_events(queryset, date_from=None, date_to=None):
+    """
+    Function narrows the events to the upcoming ones happening between given dates.
+    Both limits are inclusive and use the index on the event date.
+    :param queryset: events queryset
+    :param date_from: value of the from param (events earlier than now are never returned)
+    :param date_to: value of the to param
+    :return: filtered queryset
+    """
+    now = timezone.now()
+    date_from = parse_date_param(date_from)
+    queryset = queryset.filter(date__gte=max(date_from, now) if date_from else now)
+
+    date_to = parse_date_param(date_to, end_of_day=True)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+
+    return queryset
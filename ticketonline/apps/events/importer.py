@@ -0,0 +1,263 @@
+import csv
+import io
+import json
+import uuid
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from ticketonline.apps.tickets.models import TicketType
+from .availability import invalidate_ticket_availability
+from .models import Event
+from .search import index_events
+
+# Columns of the CSV input - every line is a single ticket type of the event, event columns are repeated
+CSV_COLUMNS = ('external_key', 'name', 'date', 'ticket_type', 'price', 'amount')
+
+
+class InvalidRow(Exception):
+    pass
+
+
+class ImportResult:
+    """
+    Counters of the imported rows.
+    Only the errors (line number and reason) of the last chunk are kept, so the memory use stays flat.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.invalid_rows = 0
+        self.events_created = 0
+        self.events_updated = 0
+        self.ticket_types_created = 0
+        self.ticket_types_updated = 0
+        self.errors = []
+
+
+def read_rows(file, file_format):
+    """
+    Generator reading the input line by line, so the whole file is never kept in memory.
+    :param file: text file with CSV (with header, see CSV_COLUMNS) or JSONL input. Every JSONL line is a single event:
+        {"external_key": "...", "name": "...", "date": "...", "tickets": [{"type": "...", "price": 0, "amount": 0}]}
+    :param file_format: csv or jsonl
+    :return: tuples (line number, raw row)
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(file, start=1):
+            if line.strip():
+                yield line_number, line
+
+
+def read_chunks(rows, chunk_size, file_format):
+    """
+    Generator splitting the rows into chunks of chunk_size rows. CSV chunk is extended while the following lines
+    belong to the same event, so all ticket types of an event are validated and saved together.
+    Lines of a single event have to be consecutive in the CSV input.
+    :param rows: tuples (line number, raw row) from read_rows
+    :param chunk_size: amount of rows in the chunk
+    :param file_format: csv or jsonl
+    :return: lists of tuples (line number, raw row)
+    """
+    def external_key(row):
+        return str(row.get('external_key') or '').strip()
+
+    chunk = []
+    for line_number, row in rows:
+        if len(chunk) >= chunk_size and not (file_format == 'csv' and external_key(row) == external_key(chunk[-1][1])):
+            yield chunk
+            chunk = []
+        chunk.append((line_number, row))
+    if chunk:
+        yield chunk
+
+
+def parse_row(row, file_format):
+    """
+    Function validates a single raw row.
+    :return: dictionary with external_key, name, date and tickets (list of dictionaries with type, price and amount)
+    :raises InvalidRow: with the reason as an argument
+    """
+    if file_format == 'csv':
+        # Line without ticket type creates the event only
+        tickets = [{'type': row.get('ticket_type'), 'price': row.get('price'), 'amount': row.get('amount')}]
+        row = {'external_key': row.get('external_key'), 'name': row.get('name'), 'date': row.get('date'),
+               'tickets': tickets if row.get('ticket_type') else []}
+    else:
+        try:
+            row = json.loads(row)
+        except ValueError as e:
+            raise InvalidRow(f"Invalid JSON: {e}")
+        if not isinstance(row, dict):
+            raise InvalidRow("Every line has to be a JSON object")
+
+    external_key = str(row.get('external_key') or '').strip()
+    if not external_key or len(external_key) > 128:
+        raise InvalidRow("external_key is required (128 characters at most)")
+
+    name = str(row.get('name') or '').strip()
+    if not name or len(name) > 512:
+        raise InvalidRow("name is required (512 characters at most)")
+
+    date = parse_datetime(str(row.get('date') or ''))
+    if date is None:
+        raise InvalidRow("date has to be a date and time in ISO 8601 format")
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+
+    tickets = dict()
+    for ticket in row.get('tickets') or []:
+        if not isinstance(ticket, dict):
+            raise InvalidRow("Every ticket has to be a JSON object")
+        ticket_type = str(ticket.get('type') or '').strip()
+        if not ticket_type or len(ticket_type) > 32:
+            raise InvalidRow("ticket type is required (32 characters at most)")
+        try:
+            price, amount = float(ticket.get('price')), int(ticket.get('amount'))
+        except (TypeError, ValueError):
+            raise InvalidRow(f"price and amount of {ticket_type} tickets have to be numbers")
+        if price < 0 or amount < 0:
+            raise InvalidRow(f"price and amount of {ticket_type} tickets can not be negative")
+        tickets[ticket_type] = {'type': ticket_type, 'price': price, 'amount': amount}
+
+    return {'external_key': external_key, 'name': name, 'date': date, 'tickets': list(tickets.values())}
+
+
+def insert_rows(model, objects, using):
+    """
+    Function inserts new rows with COPY on PostgreSQL and with bulk_create on other databases.
+    :param model: model class
+    :param objects: list of model objects with primary keys set
+    :param using: database alias
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        model.objects.using(using).bulk_create(objects, batch_size=500)
+        return
+
+    fields = model._meta.concrete_fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in objects:
+        writer.writerow([field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields])
+    buffer.seek(0)
+
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) "
+                           f"FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def import_chunk(rows, result, upsert=False, using='default'):
+    """
+    Function saves a chunk of valid rows. Events are matched by external_key and ticket types by event and type.
+    :param rows: list of tuples (line number, parsed row)
+    :param result: ImportResult updated with the counters and errors
+    :param upsert: whether to update the events which already exist instead of reporting them as invalid
+    :param using: database alias
+    """
+    # Merge the rows of the same event (CSV has a line per ticket type)
+    events = dict()
+    for line_number, row in rows:
+        event = events.setdefault(row['external_key'], {'lines': [], 'tickets': dict()})
+        event.update(name=row['name'], date=row['date'])
+        event['lines'].append(line_number)
+        event['tickets'].update((ticket['type'], ticket) for ticket in row['tickets'])
+
+    existing_events = {event.external_key: event for event in
+                       Event.objects.using(using).filter(external_key__in=events.keys())}
+    # Ticket types are locked, so a reservation made meanwhile can not exceed the new amount
+    existing_tickets = {(ticket.event_id, ticket.type): ticket for ticket in
+                        TicketType.objects.using(using).select_for_update()
+                        .filter(event__in=existing_events.values())}
+
+    new_events, updated_events, new_tickets, updated_tickets = [], [], [], []
+    for external_key, data in events.items():
+        event = existing_events.get(external_key)
+
+        # Validate the whole event before saving any of its rows
+        try:
+            if event is not None and not upsert:
+                raise InvalidRow(f"Event {external_key} already exists (use --upsert to update it)")
+            for ticket in data['tickets'].values():
+                existing_ticket = existing_tickets.get((event.id, ticket['type'])) if event else None
+                if existing_ticket and ticket['amount'] < existing_ticket.amount_reserved:
+                    raise InvalidRow(f"Amount of {ticket['type']} tickets is lower than the amount already reserved")
+        except InvalidRow as e:
+            result.invalid_rows += len(data['lines'])
+            result.errors += [(line_number, e.args[0]) for line_number in data['lines']]
+            continue
+
+        if event is None:
+            event = Event(id=uuid.uuid4(), external_key=external_key, name=data['name'], date=data['date'])
+            new_events.append(event)
+        else:
+            event.name, event.date = data['name'], data['date']
+            updated_events.append(event)
+
+        for ticket in data['tickets'].values():
+            existing_ticket = existing_tickets.get((event.id, ticket['type']))
+            if existing_ticket is None:
+                new_tickets.append(TicketType(id=uuid.uuid4(), event_id=event.id, type=ticket['type'],
+                                              price=ticket['price'], amount=ticket['amount']))
+            else:
+                existing_ticket.price, existing_ticket.amount = ticket['price'], ticket['amount']
+                updated_tickets.append(existing_ticket)
+
+    insert_rows(Event, new_events, using)
+    insert_rows(TicketType, new_tickets, using)
+    Event.objects.using(using).bulk_update(updated_events, ['name', 'date'], batch_size=500)
+    TicketType.objects.using(using).bulk_update(updated_tickets, ['price', 'amount'], batch_size=500)
+
+    # Bulk operations do not send signals - update the search index and the cached details of changed events
+    index_events(new_events + updated_events, using=using)
+    if updated_events:
+        invalidate_ticket_availability([event.id for event in updated_events], touch=True)
+
+    result.events_created += len(new_events)
+    result.events_updated += len(updated_events)
+    result.ticket_types_created += len(new_tickets)
+    result.ticket_types_updated += len(updated_tickets)
+
+
+def import_events(file, file_format, chunk_size=1000, upsert=False, dry_run=False, using='default',
+                  on_chunk=None):
+    """
+    Function imports events and their ticket types from CSV or JSONL input chunk by chunk.
+    Every chunk is validated and saved in its own transaction, so memory use does not depend on the size of the input.
+    Invalid rows are skipped and reported in the result.
+    :param file: text file (see read_rows)
+    :param file_format: csv or jsonl
+    :param chunk_size: amount of rows validated and saved at once
+    :param upsert: whether to update the events with external_key which already exists
+    :param dry_run: whether to roll back every chunk after validating and saving it
+    :param using: database alias
+    :param on_chunk: optional function called with the result after every chunk
+    :return: ImportResult
+    """
+    result = ImportResult()
+    rows = read_rows(file, file_format)
+
+    for chunk in read_chunks(rows, chunk_size, file_format):
+        result.errors = []
+        valid_rows = []
+        for line_number, row in chunk:
+            try:
+                valid_rows.append((line_number, parse_row(row, file_format)))
+            except InvalidRow as e:
+                result.invalid_rows += 1
+                result.errors.append((line_number, e.args[0]))
+        result.rows += len(chunk)
+
+        with transaction.atomic(using=using):
+            import_chunk(valid_rows, result, upsert=upsert, using=using)
+            if dry_run:
+                transaction.set_rollback(True, using=using)
+
+        if on_chunk is not None:
+            on_chunk(result)
+
+    return result
@@ -0,0 +1,71 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from ticketonline.apps.events.management.commands.benchmark_endpoints import percentile
+from ticketonline.apps.events.models import Event
+
+
+class Command(BaseCommand):
+    help = "Measures the overhead of opening a database connection for every request (CONN_MAX_AGE=0) " \
+           "compared to persistent connections, with and without the connection health check, and reports it as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help="Amount of simulated requests in each mode")
+        parser.add_argument('--database', default='default', help="Alias of the database to benchmark")
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.in_atomic_block:
+            raise CommandError("Benchmark can not be run inside a transaction")
+
+        def request_query():
+            # The query made by a simple read request
+            Event.objects.using(options['database']).filter(id=None).exists()
+
+        def new_connection():
+            connection.close()
+            request_query()
+
+        def persistent_connection():
+            request_query()
+
+        def health_checked_connection():
+            if connection.connection is not None and not connection.is_usable():
+                connection.close()
+            request_query()
+
+        modes = {
+            "new connection per request": new_connection,
+            "persistent connection": persistent_connection,
+            "persistent connection with health check": health_checked_connection,
+        }
+
+        results = {name: self.measure(mode, options['iterations']) for name, mode in modes.items()}
+        connection.close()
+
+        new, persistent = results["new connection per request"], results["persistent connection"]
+        self.stdout.write(json.dumps({
+            "database": connection.vendor,
+            "iterations": options['iterations'],
+            "modes": results,
+            "connection_setup_overhead_ms": round(new['mean_ms'] - persistent['mean_ms'], 3),
+        }, indent=2))
+
+    def measure(self, request, iterations):
+        # Warm up - open the connection used by the persistent modes
+        request()
+
+        latencies = []
+        for i in range(iterations):
+            started = time.perf_counter()
+            request()
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+
+        return {
+            "mean_ms": round(sum(latencies) / len(latencies), 3),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+        }
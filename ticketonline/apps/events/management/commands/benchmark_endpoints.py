@@ -0,0 +1,317 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.utils import timezone
+from ticketonline.apps.events.availability import invalidate_ticket_availability
+from ticketonline.apps.events.models import Event, Reservation
+from ticketonline.apps.tickets.models import TicketType, OrderedTicket
+from ticketonline.apps.payments.models import Transaction
+from ticketonline.testing import QueryCounter
+
+# Default mix of requests - every request is repeated weight times in a single round of the scenario
+# Requests which change the data (reserve tickets, pay for them...) are marked with "writes"
+DEFAULT_SCENARIO = [
+    {"name": "event list", "method": "GET", "path": "/events/event/", "params": {"page_size": 20}, "weight": 4},
+    {"name": "event detail", "method": "POST", "path": "/events/event/", "data": {"event_id": "{event_id}"},
+     "weight": 4},
+    {"name": "reservation create", "method": "POST", "path": "/events/reservation/",
+     "data": {"event_id": "{event_id}", "tickets": [{"type": "Standard", "amount": 1}]}, "weight": 1,
+     "writes": True},
+    {"name": "reservation detail", "method": "GET", "path": "/events/reservation/",
+     "params": {"reservation_id": "{reservation_id}"}, "weight": 2},
+    {"name": "stats", "method": "GET", "path": "/events/stats/", "params": {"event_id": "{event_id}"}, "weight": 2},
+    {"name": "transaction status", "method": "GET", "path": "/transactions/list/",
+     "params": {"transaction_id": "{transaction_id}"}, "weight": 2},
+]
+
+
+def fill_placeholders(value, context):
+    """
+    Function replaces {name} placeholders in the request params with the values from the context.
+    """
+    if isinstance(value, str):
+        return value.format_map(context)
+    if isinstance(value, dict):
+        return {key: fill_placeholders(item, context) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill_placeholders(item, context) for item in value]
+    return value
+
+
+def percentile(sorted_values, percent):
+    """
+    Function returns the nearest-rank percentile of already sorted values.
+    """
+    if not sorted_values:
+        return None
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class TestClientTransport:
+    """
+    Sends requests to the application in the same process with Django test client and counts SQL queries.
+    """
+
+    def __init__(self):
+        self.client = Client()
+
+    def send(self, method, path, params, data):
+        with QueryCounter() as counter:
+            if method == 'GET':
+                response = self.client.get(path, params)
+            else:
+                if params:
+                    path = f"{path}?{urllib.parse.urlencode(params)}"
+                response = getattr(self.client, method.lower())(path, json.dumps(data or {}),
+                                                                 content_type='application/json')
+
+        return response.status_code, response.content, len(counter.queries)
+
+
+class HttpTransport:
+    """
+    Sends requests to a running server. SQL queries can not be counted in this mode.
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def send(self, method, path, params, data):
+        url = f"{self.url}{path}"
+        if params:
+            url = f"{url}?{urllib.parse.urlencode(params)}"
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(url, data=body, method=method, headers={'Content-Type': 'application/json'})
+
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read(), None
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), None
+
+
+class Command(BaseCommand):
+    help = "Replays a mix of requests against the API and reports latency percentiles, throughput " \
+           "and SQL queries per request for each endpoint as JSON. Use --settings to choose the settings module."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', help="JSON file with a list of requests to replay (name, method, path, "
+                                               "params, data, weight, writes). Built-in mix of requests by default")
+        parser.add_argument('--requests', type=int, default=1000, help="Total amount of requests to send")
+        parser.add_argument('--concurrency', type=int, default=1, help="Amount of clients sending requests at once")
+        parser.add_argument('--url', help="Address of a running server (e.g. http://localhost:8000). "
+                                          "Requests are sent with Django test client in this process by default")
+        parser.add_argument('--seed', action='store_true', default=True,
+                            help="Create an event with ticket types, a reservation and a transaction to benchmark "
+                                 "and remove them afterwards (default)")
+        parser.add_argument('--no-seed', action='store_false', dest='seed',
+                            help="Use the existing events, reservations and transactions instead of the seeded ones")
+        parser.add_argument('--allow-writes', action='store_true',
+                            help="Allow the requests which change the data (e.g. reserve tickets) with --no-seed. "
+                                 "They use up the tickets of real events, so never use it against production data")
+        parser.add_argument('--output', help="File to write the results to (standard output by default)")
+
+    def handle(self, *args, **options):
+        scenario = DEFAULT_SCENARIO
+        if options['scenario']:
+            with open(options['scenario']) as scenario_file:
+                scenario = json.load(scenario_file)
+
+        # Without the seeded data the writes would reserve tickets of the real events
+        writes = [request.get('name', request['path']) for request in scenario if request.get('writes')]
+        if writes and not options['seed'] and not options['allow_writes']:
+            raise CommandError(f"Scenario changes the existing data ({', '.join(writes)}), "
+                               f"remove --no-seed or pass --allow-writes")
+
+        context = self.seed() if options['seed'] else self.find_context()
+        try:
+            report = self.benchmark(scenario, context, options)
+        finally:
+            if options['seed']:
+                self.remove_seed(context)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def benchmark(self, scenario, context, options):
+        """
+        Method replays the scenario and returns the report.
+        """
+        requests = self.plan_requests(scenario, options['requests'])
+
+        # Make sure all the placeholders used in the scenario can be filled
+        for request in scenario:
+            try:
+                fill_placeholders(request, context)
+            except KeyError as e:
+                raise CommandError(f"No value for {e.args[0]} placeholder, remove --no-seed to create benchmark data")
+
+        if options['url']:
+            def transport():
+                return HttpTransport(options['url'])
+        else:
+            transport = TestClientTransport
+
+        results, duration = self.run(requests, context, transport, options['concurrency'])
+
+        report = self.report(results, duration)
+        report.update({
+            "settings": settings.SETTINGS_MODULE,
+            "target": options['url'] or "test client",
+            "concurrency": options['concurrency'],
+        })
+        return report
+
+    def seed(self):
+        """
+        Method creates the data used by the default scenario.
+        """
+        event = Event(name="Benchmark event", date=timezone.now() + timedelta(days=30))
+        event.save()
+        TicketType(type="Standard", price=50, amount=1000000, amount_reserved=2, event=event).save()
+        TicketType(type="VIP", price=100, amount=1000, event=event).save()
+
+        reservation = Reservation(event=event, status='COMPLETED', pending_until=timezone.now())
+        reservation.save()
+        OrderedTicket(type="Standard", price=50, quantity=2, event=event, reservation=reservation).save()
+        payment = Transaction(amount=100, status='COMPLETED', reservation=reservation)
+        payment.save()
+
+        return {"event_id": str(event.id), "reservation_id": str(reservation.id), "transaction_id": str(payment.id)}
+
+    def remove_seed(self, context):
+        """
+        Method removes the seeded event along with its ticket types, reservations (including the ones made
+        by the benchmark) and transactions.
+        The data can not be rolled back instead, because the concurrent clients and the server (--url) use
+        their own connections and have to see it committed.
+        """
+        Event.objects.filter(id=context['event_id']).delete()
+        invalidate_ticket_availability([context['event_id']])
+
+    def find_context(self):
+        """
+        Method finds existing data to fill the scenario placeholders with.
+        """
+        context = dict()
+        event = Event.objects.filter(date__gte=timezone.now(), ticket_types__isnull=False).order_by('date').first()
+        if event:
+            context['event_id'] = str(event.id)
+        reservation = Reservation.objects.order_by('-reservation_date').first()
+        if reservation:
+            context['reservation_id'] = str(reservation.id)
+        payment = Transaction.objects.order_by('-date').first()
+        if payment:
+            context['transaction_id'] = str(payment.id)
+        return context
+
+    def plan_requests(self, scenario, amount):
+        """
+        Method repeats the scenario (every request weight times) until the given amount of requests.
+        """
+        scenario_round = [request for request in scenario for i in range(request.get('weight', 1))]
+        return [scenario_round[i % len(scenario_round)] for i in range(amount)]
+
+    def run(self, requests, context, transport, concurrency):
+        """
+        Method sends all the requests using given amount of clients.
+        :return: tuple (list of results (name, latency in seconds, error, queries), duration in seconds)
+        """
+        pending = iter(requests)
+        lock = threading.Lock()
+        results = []
+
+        def client(close_connections):
+            sender = transport()
+            # Every client follows its own reservations
+            client_context = dict(context)
+            try:
+                while True:
+                    with lock:
+                        request = next(pending, None)
+                    if request is None:
+                        return
+
+                    params = fill_placeholders(request.get('params'), client_context)
+                    data = fill_placeholders(request.get('data'), client_context)
+
+                    started = time.perf_counter()
+                    status, content, queries = sender.send(request['method'], request['path'], params, data)
+                    latency = time.perf_counter() - started
+
+                    try:
+                        body = json.loads(content)
+                    except ValueError:
+                        body = None
+                    error = status >= 400 or (isinstance(body, dict) and 'error' in body)
+                    if isinstance(body, dict) and 'reservation_id' in body:
+                        client_context['reservation_id'] = str(body['reservation_id'])
+
+                    with lock:
+                        results.append((request.get('name', f"{request['method']} {request['path']}"), latency,
+                                        error, queries))
+            finally:
+                if close_connections:
+                    connections.close_all()
+
+        started = time.perf_counter()
+        if concurrency == 1:
+            client(close_connections=False)
+        else:
+            threads = [threading.Thread(target=client, args=(True,)) for i in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        return results, time.perf_counter() - started
+
+    def report(self, results, duration):
+        """
+        Method calculates statistics for each endpoint.
+        """
+        endpoints = dict()
+        for name, latency, error, queries in results:
+            endpoint = endpoints.setdefault(name, {"latencies": [], "errors": 0, "queries": []})
+            endpoint['latencies'].append(latency * 1000)
+            endpoint['errors'] += error
+            if queries is not None:
+                endpoint['queries'].append(queries)
+
+        report = {
+            "requests": len(results),
+            "duration": round(duration, 3),
+            "throughput": round(len(results) / duration, 1) if duration else None,
+            "endpoints": dict(),
+        }
+        for name, endpoint in endpoints.items():
+            latencies = sorted(endpoint['latencies'])
+            report['endpoints'][name] = {
+                "requests": len(latencies),
+                "errors": endpoint['errors'],
+                "throughput": round(len(latencies) / duration, 1) if duration else None,
+                "latency_ms": {
+                    "p50": round(percentile(latencies, 50), 2),
+                    "p95": round(percentile(latencies, 95), 2),
+                    "p99": round(percentile(latencies, 99), 2),
+                    "mean": round(sum(latencies) / len(latencies), 2),
+                    "max": round(latencies[-1], 2),
+                },
+                "queries_per_request": round(sum(endpoint['queries']) / len(endpoint['queries']), 2)
+                if endpoint['queries'] else None,
+            }
+
+        return report
@@ -0,0 +1,109 @@
+import json
+import timeit
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from ticketonline.apps.events.models import Event, Reservation
+from ticketonline.apps.events.serializers import EventSerializer, ReservationSerializer
+from ticketonline.apps.events.serializers import event_row_serializer, reservation_row_serializer
+from ticketonline.apps.tickets.models import TicketType, OrderedTicket
+from ticketonline.apps.tickets.serializers import OrderedTicketSerializer, TicketTypeSerializer
+from ticketonline.apps.tickets.serializers import ordered_ticket_row_serializer, ticket_type_row_serializer
+
+
+class Command(BaseCommand):
+    help = "Compares the time of building the responses of the read endpoints with the model serializers " \
+           "and with the fast row serializers (fetching the rows included) and reports the gain as JSON. " \
+           "Benchmark data is created in a transaction which is rolled back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help="Amount of responses built with each path")
+        parser.add_argument('--page-size', type=int, default=20, help="Amount of events on the event list page")
+        parser.add_argument('--ticket-types', type=int, default=10, help="Amount of ticket types of the event")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            context = self.seed(options['page_size'], options['ticket_types'])
+            results = {name: self.compare(name, drf, fast, options['iterations'])
+                       for name, (drf, fast) in self.endpoints(context, options['page_size']).items()}
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps({"iterations": options['iterations'], "endpoints": results}, indent=2))
+
+    def seed(self, page_size, ticket_types):
+        now = timezone.now()
+        Event.objects.bulk_create([Event(name=f"Benchmark event {i}", date=now + timedelta(days=i + 1))
+                                   for i in range(page_size)])
+
+        event = Event.objects.create(name="Benchmark event", date=now + timedelta(days=30))
+        TicketType.objects.bulk_create([TicketType(type=f"Type {i}", price=10 + i, amount=1000, event=event)
+                                        for i in range(ticket_types)])
+
+        reservation = Reservation.objects.create(event=event, pending_until=now + timedelta(minutes=15))
+        OrderedTicket.objects.bulk_create([OrderedTicket(type=f"Type {i}", price=10 + i, quantity=2, event=event,
+                                                         reservation=reservation)
+                                           for i in range(ticket_types)])
+
+        return {"event_id": event.id, "reservation_id": reservation.id}
+
+    def endpoints(self, context, page_size):
+        """
+        Method returns the functions building the response content of every endpoint in both ways.
+        """
+        events = Event.objects.order_by('date', 'id')
+
+        def event_list_drf():
+            return JsonResponse({"events": EventSerializer(events[:page_size], many=True).data}).content
+
+        def event_list_fast():
+            rows = event_row_serializer.values(events)[:page_size]
+            return JsonResponse({"events": event_row_serializer.serialize_many(rows)}).content
+
+        def event_detail_drf():
+            event = Event.objects.get(id=context['event_id'])
+            ticket_types = TicketTypeSerializer(TicketType.objects.filter(event_id=event.id), many=True).data
+            return JsonResponse({"event": EventSerializer(event).data, "ticket_types": ticket_types}).content
+
+        def event_detail_fast():
+            event = event_row_serializer.values(Event.objects.filter(id=context['event_id'])).get()
+            ticket_types = ticket_type_row_serializer.serialize_many(
+                ticket_type_row_serializer.values(TicketType.objects.filter(event_id=event['id'])))
+            return JsonResponse({"event": event_row_serializer.serialize(event), "ticket_types": ticket_types}).content
+
+        def reservation_detail_drf():
+            reservation = Reservation.objects.select_related('event').get(id=context['reservation_id'])
+            return JsonResponse({
+                "reservation": ReservationSerializer(reservation).data,
+                "tickets": OrderedTicketSerializer(reservation.tickets.all(), many=True).data,
+                "event": EventSerializer(reservation.event).data,
+            }).content
+
+        def reservation_detail_fast():
+            reservation = Reservation.objects.select_related('event').get(id=context['reservation_id'])
+            tickets = ordered_ticket_row_serializer.values(reservation.tickets.all())
+            return JsonResponse({
+                "reservation": reservation_row_serializer.serialize(reservation),
+                "tickets": ordered_ticket_row_serializer.serialize_many(tickets),
+                "event": event_row_serializer.serialize(reservation.event),
+            }).content
+
+        return {
+            "event list": (event_list_drf, event_list_fast),
+            "event detail": (event_detail_drf, event_detail_fast),
+            "reservation detail": (reservation_detail_drf, reservation_detail_fast),
+        }
+
+    def compare(self, name, drf, fast, iterations):
+        if drf() != fast():
+            raise CommandError(f"Responses of {name} are different")
+
+        drf_time = min(timeit.repeat(drf, number=iterations, repeat=3)) / iterations
+        fast_time = min(timeit.repeat(fast, number=iterations, repeat=3)) / iterations
+
+        return {
+            "model_serializer_us": round(drf_time * 1000000, 1),
+            "row_serializer_us": round(fast_time * 1000000, 1),
+            "speedup": round(drf_time / fast_time, 2),
+        }
@@ -0,0 +1,54 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from ticketonline.apps.events.importer import import_events
+
+
+class Command(BaseCommand):
+    help = "Imports events and their ticket types from a CSV or JSONL file chunk by chunk. " \
+           "CSV has a line per ticket type with columns: external_key, name, date, ticket_type, price, amount. " \
+           "JSONL has a line per event: {\"external_key\", \"name\", \"date\", \"tickets\": [{\"type\", \"price\", " \
+           "\"amount\"}]}. Events are matched by external_key and ticket types by event and type."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path of the input file, - reads from the standard input")
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help="Format of the input (by default based on the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Amount of rows validated and saved at once")
+        parser.add_argument('--upsert', action='store_true',
+                            help="Update the events with external_key which already exists instead of skipping them")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and save every chunk, then roll it back")
+        parser.add_argument('--database', default='default', help="Alias of the database to import to")
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or ('csv' if options['path'].endswith('.csv') else 'jsonl')
+        if options['chunk_size'] < 1:
+            raise CommandError("Chunk size has to be a positive number")
+
+        started = time.perf_counter()
+
+        def report_chunk(result):
+            for line_number, error in result.errors:
+                self.stderr.write(f"Line {line_number}: {error}")
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{result.rows} rows ({self.rows_per_second(result, started)} rows/s)")
+
+        if options['path'] == '-':
+            result = self.run_import(sys.stdin, file_format, options, report_chunk)
+        else:
+            with open(options['path'], newline='', encoding='utf-8') as file:
+                result = self.run_import(file, file_format, options, report_chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Validated' if options['dry_run'] else 'Imported'} {result.rows} rows "
+            f"in {time.perf_counter() - started:.2f}s ({self.rows_per_second(result, started)} rows/s). "
+            f"Events created: {result.events_created}, updated: {result.events_updated}. "
+            f"Ticket types created: {result.ticket_types_created}, updated: {result.ticket_types_updated}. "
+            f"Invalid rows: {result.invalid_rows}."))
+
+    def run_import(self, file, file_format, options, report_chunk):
+        return import_events(file, file_format, chunk_size=options['chunk_size'], upsert=options['upsert'],
+                             dry_run=options['dry_run'], using=options['database'], on_chunk=report_chunk)
+
+    def rows_per_second(self, result, started):
+        return round(result.rows / max(time.perf_counter() - started, 1e-9))
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_event_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(status='PENDING'), fields=['pending_until'], name='reservation_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_reservation_pending_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['reservation_date', 'id'], name='reservation_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_reservation_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitingRoom',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='waiting_room', serialize=False, to='events.Event')),
+                ('admission_rate', models.FloatField(default=10)),
+                ('burst', models.PositiveIntegerField(default=10)),
+                ('next_slot', models.DateTimeField(blank=True, null=True)),
+                ('issued', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
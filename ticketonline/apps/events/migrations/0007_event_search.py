@@ -0,0 +1,60 @@
+import re
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def name_trigrams(text):
+    """
+    Copy of ticketonline.apps.events.search.name_trigrams at the time of the migration
+    (changes of the application code must not change what the migration does).
+    """
+    trigrams = set()
+    for word in re.findall(r'\w+', text.lower()):
+        padded = '  ' + word + ' '
+        trigrams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return trigrams
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # Trigram index of the event names
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute('CREATE INDEX event_name_trgm_idx ON events_event USING gin (name gin_trgm_ops)')
+        return
+
+    # Inverted index of the names of existing events
+    Event = apps.get_model('events', 'Event')
+    EventSearchTrigram = apps.get_model('events', 'EventSearchTrigram')
+    db_alias = schema_editor.connection.alias
+    EventSearchTrigram.objects.using(db_alias).bulk_create([
+        EventSearchTrigram(trigram=trigram, event=event)
+        for event in Event.objects.using(db_alias).only('id', 'name').iterator()
+        for trigram in name_trigrams(event.name)
+    ], batch_size=1000)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS event_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_event_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSearchTrigram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_trigrams', to='events.Event')),
+            ],
+            options={
+                'unique_together': {('trigram', 'event')},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_event_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='external_key',
+            field=models.CharField(blank=True, max_length=128, null=True, unique=True),
+        ),
+    ]
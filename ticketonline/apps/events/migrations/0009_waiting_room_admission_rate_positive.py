@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_event_external_key'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='waitingroom',
+            constraint=models.CheckConstraint(check=models.Q(admission_rate__gt=0), name='waiting_room_admission_rate_positive'),
+        ),
+    ]
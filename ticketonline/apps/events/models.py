@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 import uuid
 
@@ -6,14 +7,45 @@ import uuid
 class Event(models.Model):
     """
     Class stores the data related to single event.
+    Attributes used to answer conditional requests:
+    - version - increased every time the event, its ticket types, reservations or payments change
+    - modified - the moment of the last change
+    Other attributes:
+    - external_key - id of the event in the promoter's system, used to update imported events (see import_events)
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=512)
     date = models.DateTimeField(auto_now=False, auto_now_add=False)
+    external_key = models.CharField(max_length=128, unique=True, null=True, blank=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    modified = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} - {self.date}"
 
+    class Meta:
+        indexes = [
+            # Used to list upcoming events page by page
+            models.Index(fields=['date', 'id'], name='event_date_id_idx'),
+        ]
+
+
+class EventSearchTrigram(models.Model):
+    """
+    Class stores the inverted index of event names used by the search on the databases without pg_trgm extension.
+    Every row links a trigram (3 letters) of a word of the event name with the event.
+    On PostgreSQL the search uses the trigram index of Event.name instead and the table stays empty.
+    """
+    trigram = models.CharField(max_length=3)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="search_trigrams")
+
+    def __str__(self):
+        return f"{self.trigram} - {self.event_id}"
+
+    class Meta:
+        # Used to find the events containing the trigrams of the searched phrase
+        unique_together = ('trigram', 'event')
+
 
 class Reservation(models.Model):
     """
@@ -44,3 +76,42 @@ class Reservation(models.Model):
 
     def __str__(self):
         return f"Event: {self.event.name}. Status: {self.status}. ({self.reservation_date})"
+
+    class Meta:
+        indexes = [
+            # Used to find expired reservations - covers only PENDING ones so it stays small
+            models.Index(fields=['pending_until'], name='reservation_pending_idx',
+                         condition=models.Q(status='PENDING')),
+            # Used to archive old reservations chunk by chunk
+            models.Index(fields=['reservation_date', 'id'], name='reservation_date_id_idx'),
+        ]
+
+
+class WaitingRoom(models.Model):
+    """
+    Class stores the state of the admission queue of particular event.
+    When an event has a waiting room, users have to get a queue token first and can make a reservation only once
+    the token is admitted. Tokens are admitted one by one in the order they were issued.
+    Attributes:
+    - admission_rate - the amount of tokens admitted per second
+    - burst - the amount of tokens which can be admitted at once when the queue is empty
+    - next_slot - the moment the next issued token will be admitted
+    - issued - the amount of tokens issued so far
+    """
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, primary_key=True, related_name="waiting_room")
+    admission_rate = models.FloatField(default=10)
+    burst = models.PositiveIntegerField(default=10)
+    next_slot = models.DateTimeField(null=True, blank=True)
+    issued = models.PositiveIntegerField(default=0)
+
+    def clean(self):
+        if self.admission_rate is not None and self.admission_rate <= 0:
+            raise ValidationError({'admission_rate': "Admission rate has to be greater than 0"})
+
+    def __str__(self):
+        return f"Waiting room: {self.event.name} ({self.admission_rate}/s)"
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(check=models.Q(admission_rate__gt=0), name='waiting_room_admission_rate_positive'),
+        ]
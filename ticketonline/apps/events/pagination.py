@@ -0,0 +1,48 @@
+import base64
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(event):
+    """
+    Function creates a cursor pointing at the given event - the last event returned on the current page.
+    :param event: Event object or a row fetched with values() containing date and id
+    :return: string safe to be used in the url
+    """
+    date, event_id = (event['date'], event['id']) if isinstance(event, dict) else (event.date, event.id)
+    position = json.dumps([date.isoformat(), str(event_id)])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Function reads the position (date and id of the event) stored in a cursor.
+    :param cursor: string created with encode_cursor
+    :return: tuple (date, id)
+    """
+    date, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    return parse_datetime(date), event_id
+
+
+def keyset_page(queryset, page_size, cursor=None):
+    """
+    Function returns a single page of events ordered by (date, id) which starts right after the cursor.
+    Only page_size + 1 rows are fetched from the database no matter how deep the page is.
+    :param queryset: events queryset (of objects or values() rows)
+    :param page_size: number of events on the page
+    :param cursor: cursor returned with the previous page or None for the first page
+    :return: tuple (list of events, cursor of the next page or None if it is the last page)
+    """
+    queryset = queryset.order_by('date', 'id')
+
+    if cursor:
+        date, event_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(date__gt=date) | Q(date=date, id__gt=event_id))
+
+    events = list(queryset[:page_size + 1])
+    if len(events) > page_size:
+        events = events[:page_size]
+        return events, encode_cursor(events[-1])
+
+    return events, None
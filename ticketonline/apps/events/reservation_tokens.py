@@ -0,0 +1,44 @@
+import time
+from django.core import signing
+
+RESERVATION_TOKEN_SALT = 'ticketonline.reservation'
+
+
+class InvalidReservationToken(Exception):
+    pass
+
+
+def create_reservation_token(reservation):
+    """
+    Function creates a token which proves that its holder made the reservation.
+    The token is signed with the secret key (HMAC) over the reservation id and the end of the PENDING period,
+    so it can be verified without any database or session storage.
+    :param reservation: Reservation object
+    :return: reservation token (string)
+    """
+    return signing.dumps({
+        'reservation_id': str(reservation.id),
+        'pending_until': reservation.pending_until.timestamp(),
+    }, salt=RESERVATION_TOKEN_SALT)
+
+
+def read_reservation_token(token):
+    """
+    Function verifies the reservation token.
+    :param token: token returned by create_reservation_token
+    :return: id of the reservation
+    :raises InvalidReservationToken: when the token was not issued by the server or the reservation
+    is not PENDING anymore, with the reason as an argument
+    """
+    if not token:
+        raise InvalidReservationToken("Reservation token is required")
+
+    try:
+        data = signing.loads(token, salt=RESERVATION_TOKEN_SALT)
+    except signing.BadSignature:
+        raise InvalidReservationToken("Reservation token is not valid")
+
+    if time.time() > data['pending_until']:
+        raise InvalidReservationToken("Reservation token has expired")
+
+    return data['reservation_id']
@@ -0,0 +1,110 @@
+import math
+import re
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import CharField, Count, FloatField, Func, Lookup, Value
+from django.utils import timezone
+from .models import Event, EventSearchTrigram
+from .serializers import event_row_serializer
+
+
+@CharField.register_lookup
+class TrigramWordSimilar(Lookup):
+    """
+    Lookup name__trigram_word_similar=phrase - some part of the name is similar to the phrase
+    (pg_trgm %> operator, uses the trigram index of the column).
+    """
+    lookup_name = 'trigram_word_similar'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} %%> {rhs}', lhs_params + rhs_params
+
+
+class TrigramWordSimilarity(Func):
+    """
+    Similarity (0-1) between the phrase and the most similar part of the text (pg_trgm word_similarity).
+    """
+    function = 'WORD_SIMILARITY'
+    output_field = FloatField()
+
+
+def uses_trigram_index(using):
+    """
+    Function checks if the database searches the events with the pg_trgm index instead of EventSearchTrigram table.
+    :param using: database alias
+    """
+    return connections[using].vendor == 'postgresql'
+
+
+def name_trigrams(text, prefix=False):
+    """
+    Function splits the text into lowercase words and returns the trigrams of the words the way pg_trgm does -
+    every word is padded with two spaces at the beginning and one space at the end.
+    :param text: event name or searched phrase
+    :param prefix: whether the last word can be incomplete (typed by the user), then it is not padded at the end
+    :return: set of trigrams
+    """
+    words = re.findall(r'\w+', text.lower())
+    trigrams = set()
+    for i, word in enumerate(words):
+        padded = '  ' + word
+        if not (prefix and i == len(words) - 1 and not text[-1].isspace()):
+            padded += ' '
+        trigrams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return trigrams
+
+
+def index_events(events, using='default'):
+    """
+    Function rebuilds the inverted index of the names of given events.
+    Nothing is stored on PostgreSQL, which indexes the names itself.
+    :param events: list of Event objects
+    :param using: database alias
+    """
+    if uses_trigram_index(using):
+        return
+
+    EventSearchTrigram.objects.using(using).filter(event__in=[event.id for event in events]).delete()
+    EventSearchTrigram.objects.using(using).bulk_create([
+        EventSearchTrigram(trigram=trigram, event_id=event.id)
+        for event in events for trigram in name_trigrams(event.name)
+    ])
+
+
+def search_events(phrase, page_size, page=1):
+    """
+    Function finds the upcoming events with a word of the name similar to the phrase. The last word of the phrase
+    can be incomplete (autocomplete) and the words can contain typos.
+    Events are ranked from the most similar and paginated in the database - only page_size + 1 rows are fetched.
+    :param phrase: searched phrase
+    :param page_size: number of events on the page
+    :param page: number of the page (starting from 1)
+    :return: tuple (list of event rows, whether there is a next page)
+    """
+    events = Event.objects.filter(date__gte=timezone.now())
+    threshold = settings.EVENT_SEARCH_THRESHOLD
+
+    if uses_trigram_index(router.db_for_read(Event)):
+        # Trigram index finds the candidates, similarity of the most similar part of the name ranks them
+        events = event_row_serializer.values(events.filter(name__trigram_word_similar=phrase)) \
+            .annotate(rank=TrigramWordSimilarity(Value(phrase), 'name')) \
+            .filter(rank__gte=threshold)
+    else:
+        # Inverted index finds the events sharing trigrams with the phrase,
+        # the more trigrams of the phrase the name contains, the higher it is ranked
+        trigrams = name_trigrams(phrase, prefix=True)
+        if not trigrams:
+            return [], False
+
+        # Name has to contain at least EVENT_SEARCH_THRESHOLD part of the trigrams of the phrase
+        # (rounded, so 0.6 of 5 trigrams means 3 trigrams and not 4)
+        min_matched = math.ceil(round(threshold * len(trigrams), 6))
+        events = event_row_serializer.values(events.filter(search_trigrams__trigram__in=trigrams)) \
+            .annotate(rank=Count('search_trigrams')) \
+            .filter(rank__gte=min_matched)
+
+    offset = (page - 1) * page_size
+    rows = list(events.order_by('-rank', 'date', 'id')[offset:offset + page_size + 1])
+    return rows[:page_size], len(rows) > page_size
@@ -1,14 +1,20 @@
 from .models import Event, Reservation
 from rest_framework import serializers
+from ticketonline.serialization import RowSerializer
 
 
 class EventSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
-        fields = '__all__'
+        exclude = ('version', 'modified', 'external_key')
 
 
 class ReservationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Reservation
         fields = '__all__'
+
+
+# Fast serializers of the read endpoints producing the same output as the ones above
+event_row_serializer = RowSerializer(EventSerializer)
+reservation_row_serializer = RowSerializer(ReservationSerializer)
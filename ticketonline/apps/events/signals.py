@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from ticketonline.apps.tickets.models import TicketType
+from .availability import invalidate_ticket_availability
+from .conditional import touch_events
+from .search import index_events
+from .models import Event
+
+
+@receiver(post_save, sender=Event)
+def event_changed(sender, instance, created, **kwargs):
+    if not created:
+        touch_events([instance.id])
+
+
+@receiver(post_save, sender=TicketType)
+@receiver(post_delete, sender=TicketType)
+def ticket_type_changed(sender, instance, **kwargs):
+    # Ticket types and amounts of tickets left are a part of the event details
+    invalidate_ticket_availability([instance.event_id], touch=True)
+
+
+@receiver(post_save, sender=Event)
+def event_name_changed(sender, instance, using, **kwargs):
+    # Keep the search index of the event name up to date
+    index_events([instance], using=using)
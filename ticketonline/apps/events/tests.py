@@ -1,10 +1,42 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
 from rest_framework.test import APIClient
-from .models import Event, Reservation
+from .models import Event, Reservation, WaitingRoom
 import datetime
 import pytz
 from datetime import timedelta
 from ticketonline.apps.tickets.models import TicketType, OrderedTicket
+from ticketonline.apps.tickets.utils.inventory import complete_reservations, reserve_tickets, InsufficientTickets
+from django.core.management import call_command, CommandError
+from io import StringIO
+from ticketonline.tasks import reservation_expired, remove_old_reservations
+from ticketonline.apps.payments.models import Transaction
+from ticketonline.apps.tickets.utils.sales import rebuild_ticket_sales
+from ticketonline.testing import QueryBudgetMixin
+from prometheus_client import REGISTRY
+from ticketonline.log import ListenerQueueHandler
+from django.http import JsonResponse
+from .search import index_events
+from .serializers import EventSerializer, ReservationSerializer, event_row_serializer, reservation_row_serializer
+from ticketonline.apps.tickets.serializers import OrderedTicketSerializer, TicketTypeSerializer
+from ticketonline.apps.tickets.serializers import ordered_ticket_row_serializer, ticket_type_row_serializer
+import logging
+from unittest import skipUnless
+from django.conf import settings
+from django.db import router, transaction, IntegrityError
+from django.core.exceptions import ValidationError
+from .availability import invalidate_ticket_availability, get_ticket_availability, availability_cache_key
+from django.http import HttpResponse
+from ticketonline.db_router import ReplicaStickinessMiddleware, read_from_replica
+from ticketonline.db_health import check_connection
+from ticketonline.serialization import FastJsonResponse
+from unittest import mock
+from django.core.cache import cache
+import tempfile
+import gzip
+import json
+import os
+import uuid
+import time
 
 
 class EventTestCase(TestCase):
@@ -30,6 +62,71 @@ class EventTestCase(TestCase):
         self.assertEqual(response.json()['last_page'], 2)
         self.assertEqual(len(response.json()['events']), 20)
 
+    def test_event_list_cursor(self):
+        """Test checks if endpoint returns all the events page by page when using cursors"""
+        # Get all the events on a single page to compare
+        response = self.client.get('/events/event/', {'current_page': 1, 'page_size': 100}, format='json')
+        all_events = [event['id'] for event in response.json()['events']]
+
+        # Walk through all the pages
+        events = []
+        params = {'page_size': 20}
+        while True:
+            response = self.client.get('/events/event/', params, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(len(response.json()['events']) <= 20)
+
+            events += [event['id'] for event in response.json()['events']]
+            if response.json()['next_cursor'] is None:
+                break
+            params['cursor'] = response.json()['next_cursor']
+
+        self.assertEqual(events, all_events)
+
+    def test_event_list_date_range(self):
+        """Test checks that the list can be narrowed to the events between given dates"""
+        today = datetime.datetime.utcnow().date()
+        params = {'page_size': 20, 'from': str(today + timedelta(days=5)), 'to': str(today + timedelta(days=9))}
+
+        response = self.client.get('/events/event/', params, format='json')
+        self.assertEqual([event['name'] for event in response.json()['events']],
+                         [f"Generated_event_{i}" for i in range(5, 10)])
+
+        response = self.client.get('/events/event/', {**params, 'current_page': 1}, format='json')
+        self.assertEqual(len(response.json()['events']), 5)
+
+        # Past events are never listed
+        params['from'] = str(today - timedelta(days=30))
+        response = self.client.get('/events/event/', params, format='json')
+        self.assertTrue(all(event['name'] != "Generated_event_0" for event in response.json()['events']))
+
+        # Invalid dates are rejected
+        response = self.client.get('/events/event/', {'page_size': 20, 'from': 'tomorrow'}, format='json')
+        self.assertTrue('error' in response.json())
+
+    def test_event_list_availability(self):
+        """Test checks that the list summarizes tickets left of every event"""
+        events = {event.name: event for event in Event.objects.all()}
+        TicketType.objects.bulk_create([
+            TicketType(type="VIP", price=100, amount=10, amount_reserved=0, event=events["Generated_event_1"]),
+            TicketType(type="Basic", price=10, amount=90, amount_reserved=10, event=events["Generated_event_1"]),
+            TicketType(type="VIP", price=100, amount=10, amount_reserved=10, event=events["Generated_event_2"]),
+            TicketType(type="Basic", price=10, amount=90, amount_reserved=85, event=events["Generated_event_2"]),
+            TicketType(type="VIP", price=100, amount=10, amount_reserved=10, event=events["Generated_event_3"]),
+        ])
+
+        response = self.client.get('/events/event/', {'page_size': 4, 'availability': 1}, format='json')
+        availability = {event['name']: event['availability'] for event in response.json()['events']}
+        self.assertEqual(availability["Generated_event_1"],
+                         {"tickets_total": 100, "tickets_left": 90, "status": "AVAILABLE"})
+        self.assertEqual(availability["Generated_event_2"]["status"], "FEW_LEFT")
+        self.assertEqual(availability["Generated_event_3"]["status"], "SOLD_OUT")
+        self.assertEqual(availability["Generated_event_4"]["tickets_total"], 0)
+
+        # Summary is added only on request
+        response = self.client.get('/events/event/', {'page_size': 4}, format='json')
+        self.assertFalse('availability' in response.json()['events'][0])
+
     def test_event_details(self):
         """
         Test checks if event detailed data returned by the server is valid.
@@ -51,8 +148,10 @@ class EventTestCase(TestCase):
         ]
 
         # Create tickets in the database
+        # Reserved counters match the ordered tickets created below
         for ticket in ticket_types:
-            TicketType(type=ticket['type'], event=new_event, price=ticket['price'], amount=ticket['amount']).save()
+            TicketType(type=ticket['type'], event=new_event, price=ticket['price'], amount=ticket['amount'],
+                       amount_reserved=ticket['amount_created']).save()
 
         # Create some ordered tickets
         for ticket_type in ticket_types:
@@ -89,6 +188,73 @@ class EventTestCase(TestCase):
             self.assertEqual(ticket_type['tickets_left'], expected_amount)
 
 
+class EventSearchTestCase(TestCase):
+    """ Test case for events/search endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        now = datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
+
+        for i, name in enumerate(["Rock concert", "Jazz Concerto night", "Opera gala", "Conference 2026"]):
+            Event(name=name, date=now + timedelta(days=i + 1)).save()
+        Event(name="Old concert", date=now - timedelta(days=1)).save()
+
+    def search(self, phrase, **params):
+        response = self.client.get('/events/search/', {'q': phrase, 'page_size': 10, **params}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_search_autocomplete(self):
+        """Test checks that the events are found by an incomplete word and ranked from the most similar"""
+        names = [event['name'] for event in self.search("conc")['events']]
+        self.assertEqual(names[:2], ["Rock concert", "Jazz Concerto night"])
+        self.assertNotIn("Opera gala", names)
+
+        # Past events are not found
+        self.assertNotIn("Old concert", names)
+
+        names = [event['name'] for event in self.search("opera g")['events']]
+        self.assertEqual(names, ["Opera gala"])
+
+    def test_search_typos(self):
+        """Test checks that the events are found by a phrase with a typo"""
+        names = [event['name'] for event in self.search("concrt ")['events']]
+        self.assertEqual(names[0], "Rock concert")
+
+        names = [event['name'] for event in self.search("opra ")['events']]
+        self.assertEqual(names, ["Opera gala"])
+
+    def test_search_pages(self):
+        """Test checks that the search results are paginated"""
+        all_events = [event['id'] for event in self.search("conc")['events']]
+
+        first_page = self.search("conc", page_size=1)
+        self.assertEqual(first_page['next_page'], 2)
+        second_page = self.search("conc", page_size=1, current_page=2)
+        self.assertEqual([event['id'] for event in first_page['events'] + second_page['events']], all_events[:2])
+
+    def test_search_index_updated(self):
+        """Test checks that renamed events are found by the new name only"""
+        event = Event.objects.get(name="Opera gala")
+        event.name = "Ballet evening"
+        event.save()
+
+        self.assertEqual(self.search("opera ")['events'], [])
+        self.assertEqual(self.search("ballet")['events'][0]['id'], str(event.id))
+
+        # Searched phrase is required
+        self.assertIn('error', self.search("  "))
+
+    def test_search_read_only(self):
+        """Test checks that the events can not be changed through the search endpoint"""
+        event = Event.objects.get(name="Opera gala")
+        self.assertEqual(self.client.post('/events/search/', {'name': "Ballet"}, format='json').status_code, 405)
+        self.assertEqual(self.client.put(f'/events/search/{event.id}/', {'name': "Ballet"},
+                                         format='json').status_code, 404)
+        self.assertEqual(self.client.delete(f'/events/search/{event.id}/').status_code, 404)
+        self.assertTrue(Event.objects.filter(id=event.id, name="Opera gala").exists())
+
+
 class ReservationTestCase(TestCase):
     """Test case for events/reservation/ endpoint"""
 
@@ -122,19 +288,176 @@ class ReservationTestCase(TestCase):
                                     ], 'event_id': str(self.event.id)},
                                     format='json')
 
-        # Check if the response returned reservation_id and sessionid
+        # Check if the response returned reservation_id and reservation_token
         self.assertEqual(response.status_code, 200)
         self.assertTrue('reservation_id' in response.json())
-        self.assertFalse(response.cookies is None)
+        self.assertTrue('reservation_token' in response.json())
 
-        # Save returned reservation_id
-        reservation_id = response.json()['reservation_id']
+        # Save returned reservation_token
+        reservation_token = response.json()['reservation_token']
+
+        # Tickets are held by the reservation
+        self.assertEqual(TicketType.objects.get(event=self.event, type="VIP").amount_reserved, 3)
+        self.assertEqual(TicketType.objects.get(event=self.event, type="Gold").amount_reserved, 1)
+
+        # Cancelling requires a valid token
+        response = self.client.delete('/events/reservation/', {'reservation_token': reservation_token[:-1] + 'x'},
+                                      format='json')
+        self.assertTrue('error' in response.json())
 
         # Try to cancel the reservation
-        response = self.client.delete('/events/reservation/', {'reservation_id': str(reservation_id)}, format='json')
+        response = self.client.delete('/events/reservation/', {'reservation_token': reservation_token}, format='json')
         self.assertEqual(response.status_code, 200)
         self.assertTrue('ok' in response.json())
 
+        # Tickets are given back after cancelling
+        self.assertEqual(TicketType.objects.get(event=self.event, type="VIP").amount_reserved, 0)
+        self.assertEqual(TicketType.objects.get(event=self.event, type="Gold").amount_reserved, 0)
+
+    def test_expired_reservation_token(self):
+        """Test checks that the reservation can not be cancelled with the token after its PENDING period"""
+        response = self.client.post('/events/reservation/',
+                                    {'tickets': [{"type": "VIP", "amount": 1}], 'event_id': str(self.event.id)},
+                                    format='json')
+        reservation_token = response.json()['reservation_token']
+
+        # Token expires together with the PENDING period of the reservation
+        with mock.patch('time.time', return_value=time.time() + 16 * 60):
+            response = self.client.delete('/events/reservation/', {'reservation_token': reservation_token},
+                                          format='json')
+        self.assertEqual(response.json()['message'], "Reservation token has expired")
+        self.assertEqual(TicketType.objects.get(event=self.event, type="VIP").amount_reserved, 1)
+
+        # Token is required
+        response = self.client.delete('/events/reservation/', format='json')
+        self.assertEqual(response.json()['message'], "Reservation token is required")
+
+    def test_tickets_left_after_reservation(self):
+        """Test checks that amounts of tickets left are up to date after making and cancelling a reservation"""
+        def tickets_left():
+            response = self.client.post('/events/event/', {'event_id': str(self.event.id)}, format='json')
+            return {ticket['type']: ticket['tickets_left'] for ticket in response.json()['ticket_types']}
+
+        # Cache amounts of tickets left
+        self.assertEqual(tickets_left()['VIP'], 50)
+
+        response = self.client.post('/events/reservation/',
+                                    {'tickets': [{"type": "VIP", "amount": 4}], 'event_id': str(self.event.id)},
+                                    format='json')
+        self.assertEqual(tickets_left()['VIP'], 46)
+
+        response = self.client.delete('/events/reservation/',
+                                      {'reservation_token': response.json()['reservation_token']}, format='json')
+        self.assertEqual(tickets_left()['VIP'], 50)
+
+    @override_settings(RESERVATION_EXPIRY_BATCH_SIZE=1)
+    def test_reservation_expired(self):
+        """Test checks that expired reservations are cancelled and their tickets are given back"""
+        # Make 3 reservations of 2 VIP tickets
+        reservation_ids = []
+        for i in range(3):
+            response = self.client.post('/events/reservation/',
+                                        {'tickets': [{"type": "VIP", "amount": 2}], 'event_id': str(self.event.id)},
+                                        format='json')
+            reservation_ids.append(response.json()['reservation_id'])
+
+        # Let 2 of them expire
+        Reservation.objects.filter(id__in=reservation_ids[:2]).update(
+            pending_until=datetime.datetime.utcnow().replace(tzinfo=pytz.utc) - timedelta(minutes=1))
+
+        # Progress is logged even though the other loggers only log warnings
+        self.assertTrue(logging.getLogger('ticketonline.tasks').isEnabledFor(logging.INFO))
+        with self.assertLogs('ticketonline.tasks', level='INFO') as logs:
+            result = reservation_expired()
+        self.assertEqual(result['expired'], 2)
+        self.assertIn("Expired 2 reservations", logs.output[0])
+
+        # Check statuses and tickets left
+        self.assertEqual(Reservation.objects.filter(id__in=reservation_ids, status='CANCELLED').count(), 2)
+        self.assertEqual(Reservation.objects.get(id=reservation_ids[2]).status, 'PENDING')
+        self.assertEqual(TicketType.objects.get(event=self.event, type="VIP").amount_reserved, 2)
+
+    def test_old_reservations_archived(self):
+        """Test checks that old reservations are moved to archive files along with their tickets and transactions"""
+        # Create an old paid reservation and a recent one
+        old_reservation = Reservation(event=self.event, status='COMPLETED', pending_until=self.event.date)
+        old_reservation.save()
+        OrderedTicket(type="VIP", price=100, quantity=2, event=self.event, reservation=old_reservation).save()
+        Transaction(amount=200, status='COMPLETED', reservation=old_reservation).save()
+        Reservation.objects.filter(id=old_reservation.id).update(
+            reservation_date=datetime.datetime.utcnow().replace(tzinfo=pytz.utc) - timedelta(days=101))
+
+        new_reservation = Reservation(event=self.event, status='COMPLETED', pending_until=self.event.date)
+        new_reservation.save()
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            with override_settings(RESERVATION_ARCHIVE_DIR=archive_dir):
+                with self.assertLogs('ticketonline.tasks', level='INFO') as logs:
+                    self.assertEqual(remove_old_reservations(), 1)
+            self.assertIn("Archived 1 reservations", logs.output[0])
+
+            # Check the archive file
+            archive_files = os.listdir(archive_dir)
+            self.assertEqual(len(archive_files), 1)
+            with gzip.open(os.path.join(archive_dir, archive_files[0]), 'rt') as archive:
+                archived = [json.loads(line) for line in archive]
+
+        self.assertEqual(len(archived), 1)
+        self.assertEqual(archived[0]['id'], str(old_reservation.id))
+        self.assertEqual(archived[0]['tickets'][0]['quantity'], 2)
+        self.assertEqual(archived[0]['transactions'][0]['amount'], 200)
+
+        # Only the old reservation was removed
+        self.assertFalse(Reservation.objects.filter(id=old_reservation.id).exists())
+        self.assertFalse(OrderedTicket.objects.filter(reservation_id=old_reservation.id).exists())
+        self.assertTrue(Reservation.objects.filter(id=new_reservation.id).exists())
+
+    def test_reservation_sold_out(self):
+        """Test checks that reservation can not hold more tickets than available"""
+        # Leave only 2 VIP tickets available
+        TicketType.objects.filter(event=self.event, type="VIP").update(amount_reserved=48)
+
+        response = self.client.post('/events/reservation/',
+                                    {'tickets': [
+                                        {"type": "Gold", "amount": 2},
+                                        {"type": "VIP", "amount": 3}
+                                    ], 'event_id': str(self.event.id)},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("quantity of VIP tickets", response.json()['message'])
+
+        # Nothing was reserved, counters of other ticket types were rolled back
+        self.assertEqual(Reservation.objects.filter(event=self.event).count(), 0)
+        self.assertEqual(TicketType.objects.get(event=self.event, type="Gold").amount_reserved, 0)
+        self.assertEqual(TicketType.objects.get(event=self.event, type="VIP").amount_reserved, 48)
+
+        # Ticket type removed in the meantime is reported as sold out as well
+        event_tickets = {t.type: t for t in TicketType.objects.filter(event=self.event)}
+        TicketType.objects.filter(id=event_tickets["Gold"].id).delete()
+        with self.assertRaisesMessage(InsufficientTickets, "Gold"), transaction.atomic():
+            reserve_tickets(event_tickets, [{"type": "Gold", "amount": 1}, {"type": "VIP", "amount": 1}])
+
+    def test_reservation_ticket_lines(self):
+        """Test checks that reservation stores one line with the amount of tickets for each ticket type"""
+        response = self.client.post('/events/reservation/',
+                                    {'tickets': [
+                                        {"type": "VIP", "amount": 3},
+                                        {"type": "Gold", "amount": 2}
+                                    ], 'event_id': str(self.event.id)},
+                                    format='json')
+        reservation_id = response.json()['reservation_id']
+
+        # Check lines of the reservation
+        lines = {line.type: line for line in OrderedTicket.objects.filter(reservation_id=reservation_id)}
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines['VIP'].quantity, 3)
+        self.assertEqual(lines['VIP'].price, 100)
+        self.assertEqual(lines['Gold'].quantity, 2)
+
+        # Check the reservation details return the lines
+        response = self.client.get('/events/reservation/', {'reservation_id': reservation_id}, format='json')
+        self.assertEqual(sum(ticket['quantity'] for ticket in response.json()['tickets']), 5)
+
     def test_reservation_details(self):
         """Test checks reservation details validity"""
         # Create a reservation
@@ -160,6 +483,162 @@ class ReservationTestCase(TestCase):
 
         self.assertEqual(len(response.json()['tickets']), 3)
 
+    def test_reservation_summary(self):
+        """Test checks that the summary mode returns a line per ticket type and the total amount"""
+        response = self.client.post('/events/reservation/', {'tickets': [
+            {"type": "VIP", "amount": 2}, {"type": "Silver", "amount": 5}
+        ], 'event_id': str(self.event.id)}, format='json')
+        reservation_id = response.json()['reservation_id']
+        details = self.client.get('/events/reservation/', {'reservation_id': reservation_id}, format='json').json()
+
+        response = self.client.get('/events/reservation/', {'reservation_id': reservation_id, 'detail': 'summary'},
+                                   format='json')
+        summary = response.json()
+        self.assertEqual(summary['ticket_summary'], [
+            {"type": "Silver", "count": 5, "unit_price": 50.0, "subtotal": 250.0},
+            {"type": "VIP", "count": 2, "unit_price": 100.0, "subtotal": 200.0},
+        ])
+        self.assertEqual(summary['total'], 450.0)
+        self.assertEqual(summary['reservation'], details['reservation'])
+        self.assertEqual(summary['event'], details['event'])
+        self.assertFalse('tickets' in summary)
+
+        # Every ticket is returned on request
+        response = self.client.get('/events/reservation/', {'reservation_id': reservation_id, 'detail': 'summary',
+                                                            'include_tickets': 1}, format='json')
+        self.assertEqual(response.json()['tickets'], details['tickets'])
+
+    def test_reservation_batch(self):
+        """Test checks that many reservations are returned at once with their tickets and events"""
+        other_event = Event.objects.create(name="Festival", date=self.event.date)
+        pending_until = datetime.datetime.utcnow().replace(tzinfo=pytz.utc) + timedelta(minutes=15)
+        reservations = [Reservation.objects.create(event=event, pending_until=pending_until)
+                        for event in [self.event, other_event, self.event]]
+        for i, reservation in enumerate(reservations):
+            OrderedTicket.objects.create(type="VIP", price=100, quantity=i + 1, event=reservation.event,
+                                         reservation=reservation)
+
+        # Compare with the details returned one by one
+        single = [self.client.get('/events/reservation/', {'reservation_id': str(reservation.id)},
+                                  format='json').json() for reservation in reservations]
+
+        missing_id = str(uuid.uuid4())
+        reservation_ids = [str(reservations[2].id), missing_id, str(reservations[0].id), "not-an-id",
+                           str(reservations[1].id)]
+        response = self.client.post('/events/reservation-batch/', {'reservation_ids': reservation_ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        data = response.json()
+        self.assertEqual(data['not_found'], [missing_id, "not-an-id"])
+        self.assertEqual(data['reservations'], [
+            {'reservation': single[i]['reservation'], 'tickets': single[i]['tickets']} for i in (2, 0, 1)
+        ])
+        self.assertEqual(data['events'], {
+            str(self.event.id): single[0]['event'], str(other_event.id): single[1]['event']
+        })
+
+        # Reservations can not be listed or changed through the batch endpoint
+        self.assertEqual(self.client.get('/events/reservation-batch/').status_code, 405)
+        response = self.client.patch(f'/events/reservation-batch/{reservations[0].id}/', {'status': "COMPLETED"},
+                                     format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Reservation.objects.get(id=reservations[0].id).status, 'PENDING')
+
+        # Reservation ids have to be a list
+        response = self.client.post('/events/reservation-batch/', {'reservation_ids': str(reservations[0].id)},
+                                    format='json')
+        self.assertEqual(response.json()['error'], "Invalid reservation ids")
+
+        # The amount of reservations is limited
+        with override_settings(RESERVATION_BATCH_MAX_SIZE=2):
+            response = self.client.post('/events/reservation-batch/', {'reservation_ids': reservation_ids},
+                                        format='json')
+        self.assertTrue('error' in response.json())
+
+
+class WaitingRoomTestCase(TestCase):
+    """Test case for events/queue/ endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        # Create an event with a waiting room admitting 1 user per 10 seconds
+        event_date = datetime.datetime.utcnow().replace(tzinfo=pytz.utc) + timedelta(days=60)
+        self.event = Event(name=f"Concert", date=event_date)
+        self.event.save()
+        TicketType(type="VIP", event=self.event, price=100, amount=50).save()
+        WaitingRoom(event=self.event, admission_rate=0.1, burst=1).save()
+
+    def reserve(self, queue_token=None):
+        return self.client.post('/events/reservation/',
+                                {'tickets': [{"type": "VIP", "amount": 1}], 'event_id': str(self.event.id),
+                                 'queue_token': queue_token},
+                                format='json').json()
+
+    def test_waiting_room(self):
+        """Test checks that only admitted queue tokens can be used to make a reservation"""
+        # Reservation can not be made without a token
+        self.assertTrue('error' in self.reserve())
+
+        # First user is admitted at once
+        response = self.client.post('/events/queue/', {'event_id': str(self.event.id)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['admitted'])
+        first_token = response.json()['queue_token']
+
+        # Second user has to wait
+        response = self.client.post('/events/queue/', {'event_id': str(self.event.id)}, format='json')
+        self.assertFalse(response.json()['admitted'])
+        self.assertEqual(response.json()['position'], 1)
+        self.assertTrue(0 < response.json()['estimated_wait'] <= 10)
+        second_token = response.json()['queue_token']
+
+        # Check token status
+        response = self.client.get('/events/queue/', {'queue_token': second_token}, format='json')
+        self.assertFalse(response.json()['admitted'])
+
+        # Only the admitted token can be used and only once
+        self.assertTrue('error' in self.reserve(second_token))
+        self.assertTrue('ok' in self.reserve(first_token))
+        self.assertTrue('error' in self.reserve(first_token))
+
+        # Tokens can not be forged
+        self.assertTrue('error' in self.reserve(first_token[:-1]))
+
+    def test_failed_reservation_keeps_admission(self):
+        """Test checks that the queue token can be used again when the reservation could not be made"""
+        queue_token = self.client.post('/events/queue/', {'event_id': str(self.event.id)},
+                                       format='json').json()['queue_token']
+
+        # Order of an unknown ticket type and a sold out order do not use the token up
+        response = self.client.post('/events/reservation/',
+                                    {'tickets': [{"type": "Gold", "amount": 1}], 'event_id': str(self.event.id),
+                                     'queue_token': queue_token}, format='json').json()
+        self.assertIn("not present", response['error'])
+        TicketType.objects.filter(event=self.event).update(amount_reserved=50)
+        self.assertIn("more tickets than available", self.reserve(queue_token)['error'])
+
+        TicketType.objects.filter(event=self.event).update(amount_reserved=0)
+        self.assertTrue('ok' in self.reserve(queue_token))
+        self.assertTrue('error' in self.reserve(queue_token))
+
+    def test_waiting_room_read_only(self):
+        """Test checks that the waiting room can not be changed or removed through the queue endpoint"""
+        url = f'/events/queue/{self.event.id}/'
+        self.assertEqual(self.client.put(url, {'admission_rate': 1000}, format='json').status_code, 404)
+        self.assertEqual(self.client.patch(url, {'admission_rate': 1000}, format='json').status_code, 404)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+        self.assertEqual(WaitingRoom.objects.get(event=self.event).admission_rate, 0.1)
+
+    def test_admission_rate_positive(self):
+        """Test checks that the waiting room has to admit users"""
+        waiting_room = WaitingRoom.objects.get(event=self.event)
+        waiting_room.admission_rate = 0
+        with self.assertRaises(ValidationError):
+            waiting_room.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            waiting_room.save()
+
 
 class StatisticsTestCase(TestCase):
     """Test case for events/stats/ endpoint"""
@@ -208,6 +687,9 @@ class StatisticsTestCase(TestCase):
                                            type=ticket_type['type'])
                 new_ticket.save()
 
+        # Count the statistics of tickets created above
+        call_command('rebuild_ticket_sales', stdout=StringIO())
+
         # Call stats endpoint
         # Verify it's reliability
         response = self.client.get('/events/stats/', {'event_id': str(new_event.id)}, format='json')
@@ -219,3 +701,686 @@ class StatisticsTestCase(TestCase):
         for ticket in ticket_types:
             self.assertEqual(response.json()['ticket_counters']['ticket_types'][ticket['type']],
                              ticket['amount_created'])
+
+    def test_statistics_after_payment(self):
+        """Test checks that stats are updated when a reservation is paid"""
+        # Create event with ticket types
+        event_date = datetime.datetime.utcnow().replace(tzinfo=pytz.utc) + timedelta(days=7)
+        new_event = Event(name=f"Concert", date=event_date)
+        new_event.save()
+        TicketType(type="VIP", event=new_event, price=100, amount=50).save()
+        TicketType(type="Gold", event=new_event, price=80, amount=150).save()
+
+        # Make a reservation and complete it
+        response = self.client.post('/events/reservation/',
+                                    {'tickets': [
+                                        {"type": "VIP", "amount": 3},
+                                        {"type": "Gold", "amount": 2}
+                                    ], 'event_id': str(new_event.id)},
+                                    format='json')
+        reservation_id = response.json()['reservation_id']
+        complete_reservations([reservation_id])
+
+        # Completing the reservation once again does not change the stats
+        complete_reservations([reservation_id])
+
+        response = self.client.get('/events/stats/', {'event_id': str(new_event.id)}, format='json')
+        self.assertEqual(response.json()['ticket_counters']['all_tickets_sold'], 5)
+        self.assertEqual(response.json()['ticket_counters']['ticket_types'], {"VIP": 3, "Gold": 2})
+
+
+class BenchmarkTestCase(TestCase):
+    """Test case for benchmark_endpoints command"""
+
+    def test_benchmark_endpoints(self):
+        """Test checks if the benchmark replays all the requests of the scenario and reports the results"""
+        output = StringIO()
+        call_command('benchmark_endpoints', seed=True, requests=30, concurrency=1, stdout=output)
+        report = json.loads(output.getvalue())
+
+        self.assertEqual(report['requests'], 30)
+        self.assertEqual(set(report['endpoints']), {"event list", "event detail", "reservation create",
+                                                    "reservation detail", "stats", "transaction status"})
+        for endpoint in report['endpoints'].values():
+            self.assertEqual(endpoint['errors'], 0)
+            self.assertTrue(endpoint['latency_ms']['p50'] <= endpoint['latency_ms']['p99'])
+            self.assertTrue(endpoint['queries_per_request'] >= 1)
+
+        # Seeded data is removed after the benchmark
+        self.assertFalse(Event.objects.exists())
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_benchmark_existing_data(self):
+        """Test checks that the benchmark does not reserve tickets of the existing events unless it is allowed to"""
+        event = Event(name="Concert", date=datetime.datetime.utcnow().replace(tzinfo=pytz.utc) + timedelta(days=30))
+        event.save()
+        TicketType(type="Standard", event=event, price=50, amount=100).save()
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_endpoints', seed=False, requests=30, stdout=StringIO())
+        self.assertFalse(Reservation.objects.exists())
+
+        # Read only scenario does not need the permission
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as scenario:
+            json.dump([{"name": "event detail", "method": "GET", "path": f"/events/event/{event.id}/"}], scenario)
+            scenario.flush()
+            output = StringIO()
+            call_command('benchmark_endpoints', seed=False, scenario=scenario.name, requests=5, stdout=output)
+        self.assertEqual(json.loads(output.getvalue())['endpoints']['event detail']['errors'], 0)
+        self.assertEqual(Event.objects.count(), 1)
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    """
+    Test case checking that the endpoints stay within their budget of SQL queries and fetched rows.
+    The budgets must not depend on the amount of events, ticket types or tickets in the database,
+    so the fixtures are large enough to expose queries made per ticket type or per ticket.
+    """
+
+    # Endpoint name: (maximum amount of queries, maximum amount of fetched rows)
+    QUERY_BUDGETS = {
+        "event list": (1, 21),
+        "event list page number": (2, 21),
+        "event list availability": (2, 41),
+        "event detail": (2, 51),
+        "event detail not modified": (1, 1),
+        "event search": (1, 21),
+        "reservation create": (11, 21),
+        "reservation detail": (3, 12),
+        "reservation summary": (2, 11),
+        "reservation payment": (3, 2),
+        "reservation cancel": (7, 11),
+        "reservation batch": (2, 200),
+        "stats": (3, 52),
+    }
+
+    TICKET_TYPES_AMOUNT = 50
+    RESERVATIONS_AMOUNT = 1000
+
+    def setUp(self):
+        self.client = APIClient()
+
+        # Create a set of events
+        now = datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
+        Event.objects.bulk_create([Event(name=f"Generated_event_{i}", date=now + timedelta(days=i + 1))
+                                   for i in range(100)])
+
+        index_events(Event.objects.all())
+
+        # Create an event with many ticket types
+        self.event = Event(name="Festival", date=now + timedelta(days=60))
+        self.event.save()
+        TicketType.objects.bulk_create([
+            TicketType(type=f"Type_{i}", event=self.event, price=10 + i, amount=100000)
+            for i in range(self.TICKET_TYPES_AMOUNT)
+        ])
+
+        # Create thousands of sold tickets
+        reservations = [Reservation(event=self.event, status='COMPLETED', pending_until=now)
+                        for i in range(self.RESERVATIONS_AMOUNT)]
+        Reservation.objects.bulk_create(reservations)
+        OrderedTicket.objects.bulk_create([
+            OrderedTicket(type=f"Type_{i % self.TICKET_TYPES_AMOUNT}", price=10, quantity=5, event=self.event,
+                          reservation=reservation)
+            for i, reservation in enumerate(reservations)
+        ])
+        rebuild_ticket_sales([self.event.id])
+
+        # Order 5 tickets of 10 types
+        self.ordered_tickets = [{"type": f"Type_{i}", "amount": 5} for i in range(10)]
+
+    def assertEndpointBudget(self, name):
+        max_queries, max_rows = self.QUERY_BUDGETS[name]
+        return self.assertQueryBudget(max_queries, max_rows, name)
+
+    def test_event_endpoints_budget(self):
+        """Test checks query budgets of events/event/ endpoint"""
+        with self.assertEndpointBudget("event list"):
+            response = self.client.get('/events/event/', {'page_size': 20}, format='json')
+        self.assertEqual(len(response.json()['events']), 20)
+
+        with self.assertEndpointBudget("event list page number"):
+            response = self.client.get('/events/event/', {'current_page': 2, 'page_size': 20}, format='json')
+        self.assertEqual(len(response.json()['events']), 20)
+
+        with self.assertEndpointBudget("event list availability"):
+            response = self.client.get('/events/event/', {'page_size': 20, 'availability': 1}, format='json')
+        self.assertEqual(len(response.json()['events']), 20)
+
+        with self.assertEndpointBudget("event detail"):
+            response = self.client.post('/events/event/', {'event_id': self.event.id}, format='json')
+        self.assertEqual(len(response.json()['ticket_types']), self.TICKET_TYPES_AMOUNT)
+
+        with self.assertEndpointBudget("event search"):
+            response = self.client.get('/events/search/', {'q': "generated event", 'page_size': 20}, format='json')
+        self.assertEqual(len(response.json()['events']), 20)
+
+        etag = self.client.get(f'/events/event/{self.event.id}/')['ETag']
+        with self.assertEndpointBudget("event detail not modified"):
+            response = self.client.get(f'/events/event/{self.event.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_reservation_endpoints_budget(self):
+        """Test checks query budgets of events/reservation/ endpoint"""
+        with self.assertEndpointBudget("reservation create"):
+            response = self.client.post('/events/reservation/',
+                                        {'tickets': self.ordered_tickets, 'event_id': self.event.id}, format='json')
+        reservation_id = response.json()['reservation_id']
+        reservation_token = response.json()['reservation_token']
+
+        with self.assertEndpointBudget("reservation detail"):
+            response = self.client.get('/events/reservation/', {'reservation_id': reservation_id}, format='json')
+        self.assertEqual(len(response.json()['tickets']), 10)
+
+        with self.assertEndpointBudget("reservation summary"):
+            response = self.client.get('/events/reservation/', {'reservation_id': reservation_id, 'detail': 'summary'},
+                                       format='json')
+        self.assertEqual(len(response.json()['ticket_summary']), 10)
+
+        with self.settings(PAYMENT_WORKER_MODE='batch'):
+            with self.assertEndpointBudget("reservation payment"):
+                response = self.client.put('/events/reservation/', {'reservation_token': reservation_token},
+                                           format='json')
+        self.assertEqual(Transaction.objects.get(id=response.json()['transaction_id']).amount,
+                         5 * sum(10 + i for i in range(10)))
+
+        # Cancel another reservation
+        response = self.client.post('/events/reservation/',
+                                    {'tickets': self.ordered_tickets, 'event_id': self.event.id}, format='json')
+        with self.assertEndpointBudget("reservation cancel"):
+            response = self.client.delete('/events/reservation/',
+                                          {'reservation_token': response.json()['reservation_token']}, format='json')
+        self.assertIn('ok', response.json())
+
+    def test_reservation_batch_budget(self):
+        """Test checks that events/reservation-batch/ endpoint makes the same queries for any amount of reservations"""
+        reservation_ids = [str(reservation_id) for reservation_id in
+                           Reservation.objects.values_list('id', flat=True)[:settings.RESERVATION_BATCH_MAX_SIZE]]
+
+        with self.assertEndpointBudget("reservation batch"):
+            response = self.client.post('/events/reservation-batch/', {'reservation_ids': reservation_ids},
+                                        format='json')
+        self.assertEqual(len(response.json()['reservations']), 100)
+        self.assertEqual(len(response.json()['events']), 1)
+
+    def test_statistics_budget(self):
+        """Test checks query budget of events/stats/ endpoint"""
+        with self.assertEndpointBudget("stats"):
+            response = self.client.get('/events/stats/', {'event_id': self.event.id}, format='json')
+        self.assertEqual(response.json()['ticket_counters']['all_tickets_sold'], 5 * self.RESERVATIONS_AMOUNT)
+
+
+class MetricsTestCase(TestCase):
+    """Test case for metrics endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        event_date = datetime.datetime.utcnow().replace(tzinfo=pytz.utc) + timedelta(days=60)
+        self.event = Event(name=f"Concert", date=event_date)
+        self.event.save()
+
+    def get_metric(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_metrics(self):
+        """Test checks if the requests, SQL queries and errors are recorded per view action"""
+        labels = {'view': 'EventViewSet', 'action': 'create'}
+        requests = self.get_metric('ticketonline_requests_total', method='POST', status='200', **labels)
+        latency = self.get_metric('ticketonline_request_duration_seconds_count', **labels)
+        queries = self.get_metric('ticketonline_db_queries_total', **labels)
+        errors = self.get_metric('ticketonline_errors_total', kind='handled', **labels)
+
+        # Get event details and ask for an event which does not exist
+        self.client.post('/events/event/', {'event_id': self.event.id}, format='json')
+        response = self.client.post('/events/event/', {'event_id': 'missing'}, format='json')
+        self.assertTrue('error' in response.json())
+
+        self.assertEqual(self.get_metric('ticketonline_requests_total', method='POST', status='200', **labels),
+                         requests + 2)
+        self.assertEqual(self.get_metric('ticketonline_request_duration_seconds_count', **labels), latency + 2)
+        self.assertTrue(self.get_metric('ticketonline_db_queries_total', **labels) >= queries + 2)
+        # Exception swallowed by log_exceptions is counted
+        self.assertEqual(self.get_metric('ticketonline_errors_total', kind='handled', **labels), errors + 1)
+
+        # Metrics are exposed in Prometheus text format
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ticketonline_requests_total{action="create",method="POST",status="200",view="EventViewSet"}',
+                      response.content.decode())
+
+
+class LoggingTestCase(TestCase):
+    """Test case for the logging handler"""
+
+    def test_log_rotation(self):
+        """Test checks if the records of all the processes are written in the background and the files are rotated"""
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'logs', 'test.log')
+            # Every process has its own handler appending to the same file
+            handlers = [ListenerQueueHandler(filename, max_bytes=1000, backup_count=3, log_format='%(message)s')
+                        for _ in range(2)]
+            loggers = []
+            for i, handler in enumerate(handlers):
+                logger = logging.getLogger(f'ticketonline.tests.rotation{i}')
+                logger.addHandler(handler)
+                logger.propagate = False
+                loggers.append(logger)
+
+            try:
+                for i in range(200):
+                    loggers[i % 2].warning(f"Log record number {i}")
+            finally:
+                for logger, handler in zip(loggers, handlers):
+                    logger.removeHandler(handler)
+                    # Wait for all the records to be written
+                    handler.close()
+
+            # Only the current file and 3 old files are kept, none of them is much larger than the limit
+            files = sorted(os.listdir(os.path.dirname(filename)))
+            self.assertEqual(files, ['test.log', 'test.log.1', 'test.log.2', 'test.log.3', 'test.log.lock'])
+            records = []
+            for name in files[:4]:
+                path = os.path.join(directory, 'logs', name)
+                self.assertTrue(os.path.getsize(path) <= 1000 + 100)
+                with open(path) as log_file:
+                    records += [int(line.split()[-1]) for line in log_file.read().splitlines()]
+
+            # No record is written twice, the oldest ones are removed and the last ones of both processes are kept
+            self.assertEqual(len(records), len(set(records)))
+            self.assertTrue(len(records) < 200)
+            self.assertIn(198, records)
+            self.assertIn(199, records)
+
+
+class RowSerializerTestCase(TestCase):
+    """Test case for the fast serializers of the read endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        event_date = datetime.datetime.utcnow().replace(tzinfo=pytz.utc) + timedelta(days=60, microseconds=123)
+        self.event = Event(name=f"Concert \u201cZa\u017c\u00f3\u0142\u0107\u201d", date=event_date)
+        self.event.save()
+        TicketType(type="VIP", event=self.event, price=99.99, amount=50).save()
+        TicketType(type="Silver", event=self.event, price=50, amount=300).save()
+
+        self.client.post('/events/reservation/',
+                         {'tickets': [{"type": "VIP", "amount": 3}, {"type": "Silver", "amount": 1}],
+                          'event_id': str(self.event.id)}, format='json')
+
+    def test_same_output(self):
+        """Test checks if the fast serializers return exactly the same JSON as the model serializers"""
+        serializers = [
+            (EventSerializer, event_row_serializer, Event.objects.all()),
+            (ReservationSerializer, reservation_row_serializer, Reservation.objects.all()),
+            (OrderedTicketSerializer, ordered_ticket_row_serializer, OrderedTicket.objects.all()),
+            (TicketTypeSerializer, ticket_type_row_serializer, TicketType.objects.all()),
+        ]
+
+        for model_serializer, row_serializer, queryset in serializers:
+            expected = JsonResponse(model_serializer(queryset, many=True).data, safe=False).content
+
+            # Rows fetched with values()
+            rows = row_serializer.serialize_many(row_serializer.values(queryset))
+            self.assertEqual(JsonResponse(rows, safe=False).content, expected)
+
+            # Model objects
+            rows = [row_serializer.serialize(instance) for instance in queryset]
+            self.assertEqual(JsonResponse(rows, safe=False).content, expected)
+
+    def test_fast_json_response(self):
+        """Test checks that the fast JSON encoder writes the same data as JsonResponse"""
+        data = {"events": event_row_serializer.serialize_many(event_row_serializer.values(Event.objects.all())),
+                "name": "Koncert žáků", "next_page": None}
+        self.assertEqual(json.loads(FastJsonResponse(data).content), json.loads(JsonResponse(data).content))
+
+        # Without orjson the response is exactly the same as JsonResponse
+        with mock.patch('ticketonline.serialization.orjson', None):
+            self.assertEqual(FastJsonResponse(data).content, JsonResponse(data).content)
+        with override_settings(FAST_JSON_ENCODER=False):
+            self.assertEqual(FastJsonResponse(data).content, JsonResponse(data).content)
+
+    def test_benchmark_serializers(self):
+        """Test checks if the serializers benchmark compares the responses of all the read endpoints"""
+        output = StringIO()
+        call_command('benchmark_serializers', iterations=2, stdout=output)
+        report = json.loads(output.getvalue())
+
+        self.assertEqual(set(report['endpoints']), {"event list", "event detail", "reservation detail"})
+        # Benchmark data is removed
+        self.assertEqual(Event.objects.count(), 1)
+
+
+class ConditionalRequestTestCase(TransactionTestCase):
+    """
+    Test case for ETag and Last-Modified support of the read endpoints
+    (events are marked as changed after the commit, so the transactions have to be committed)
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        event_date = datetime.datetime.utcnow().replace(tzinfo=pytz.utc) + timedelta(days=60)
+        self.event = Event(name=f"Concert", date=event_date)
+        self.event.save()
+        TicketType(type="VIP", event=self.event, price=100, amount=50).save()
+
+        # Amounts of tickets left and sold are considered changed only in the next period
+        self.period = int(time.time()) // settings.AVAILABILITY_CACHE_TIMEOUT
+        period_patcher = mock.patch('ticketonline.apps.events.conditional.availability_period',
+                                    side_effect=lambda: self.period)
+        period_patcher.start()
+        self.addCleanup(period_patcher.stop)
+
+    def assertNotModified(self, path, params, etag):
+        response = self.client.get(path, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_version_changed_after_commit(self):
+        """Test checks that the event row is not locked by the transactions changing its reservations"""
+        version = Event.objects.get(id=self.event.id).version
+        with transaction.atomic():
+            invalidate_ticket_availability([self.event.id], touch=True)
+            self.assertEqual(Event.objects.get(id=self.event.id).version, version)
+        self.assertEqual(Event.objects.get(id=self.event.id).version, version + 1)
+
+    def test_cache_cleared_before_version_changed(self):
+        """Test checks that the new version of the event is never served with the old cached amounts"""
+        get_ticket_availability(self.event.id)
+        key = availability_cache_key(self.event.id)
+
+        def touch_events(event_ids):
+            self.assertIsNone(cache.get(key))
+
+        with mock.patch('ticketonline.apps.events.availability.touch_events', side_effect=touch_events) as touch:
+            with transaction.atomic():
+                invalidate_ticket_availability([self.event.id], touch=True)
+                get_ticket_availability(self.event.id)
+        touch.assert_called_once()
+
+    def test_version_changed_only_with_availability(self):
+        """Test checks that the event is marked as changed only when a ticket type sells out or becomes available"""
+        def reserve(amount):
+            return self.client.post('/events/reservation/', {'tickets': [{"type": "VIP", "amount": amount}],
+                                                             'event_id': str(self.event.id)}, format='json')
+
+        def version():
+            return Event.objects.get(id=self.event.id).version
+
+        # Only 5 tickets are left
+        TicketType.objects.filter(event=self.event).update(amount_reserved=45)
+        initial_version = version()
+        reservation_token = reserve(2).json()['reservation_token']
+        self.assertEqual(version(), initial_version)
+
+        # The rest of the tickets sells out the ticket type
+        reserve(3)
+        self.assertEqual(version(), initial_version + 1)
+
+        # Cancelled reservation makes the tickets available again
+        self.client.delete('/events/reservation/', {'reservation_token': reservation_token}, format='json')
+        self.assertEqual(version(), initial_version + 2)
+
+    def test_event_details(self):
+        """Test checks if event details are answered with 304 until the event changes"""
+        path = f'/events/event/{self.event.id}/'
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['ticket_types'][0]['tickets_left'], 50)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+
+        self.assertNotModified(path, {}, etag)
+        response = self.client.get(path, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        # Reservation changes amount of tickets left, which is picked up in the next period
+        self.client.post('/events/reservation/', {'tickets': [{"type": "VIP", "amount": 2}],
+                                                  'event_id': str(self.event.id)}, format='json')
+        self.assertNotModified(path, {}, etag)
+        self.period += 1
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['ticket_types'][0]['tickets_left'], 48)
+        etag = response['ETag']
+
+        # Sold out ticket type changes the event immediately
+        TicketType.objects.filter(event=self.event).update(amount_reserved=47)
+        self.client.post('/events/reservation/', {'tickets': [{"type": "VIP", "amount": 3}],
+                                                  'event_id': str(self.event.id)}, format='json')
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['ticket_types'][0]['tickets_left'], 0)
+        etag = response['ETag']
+
+        # So does a change of the ticket types
+        TicketType(type="Silver", event=self.event, price=50, amount=100).save()
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['ticket_types']), 2)
+
+    def test_reservation_and_statistics(self):
+        """Test checks if reservation details and statistics are answered with 304 until they change"""
+        response = self.client.post('/events/reservation/', {'tickets': [{"type": "VIP", "amount": 2}],
+                                                             'event_id': str(self.event.id)}, format='json')
+        reservation_params = {'reservation_id': response.json()['reservation_id']}
+        stats_params = {'event_id': str(self.event.id)}
+
+        response = self.client.get('/events/reservation/', reservation_params)
+        self.assertIn('private', response['Cache-Control'])
+        reservation_etag = response['ETag']
+        stats_etag = self.client.get('/events/stats/', stats_params)['ETag']
+
+        self.assertNotModified('/events/reservation/', reservation_params, reservation_etag)
+        self.assertNotModified('/events/stats/', stats_params, stats_etag)
+
+        # Paying for the reservation changes its status and ticket sales
+        complete_reservations([reservation_params['reservation_id']])
+
+        response = self.client.get('/events/reservation/', reservation_params, HTTP_IF_NONE_MATCH=reservation_etag)
+        self.assertEqual(response.json()['reservation']['status'], 'COMPLETED')
+        self.assertNotModified('/events/stats/', stats_params, stats_etag)
+        self.period += 1
+        response = self.client.get('/events/stats/', stats_params, HTTP_IF_NONE_MATCH=stats_etag)
+        self.assertEqual(response.json()['ticket_counters']['all_tickets_sold'], 2)
+
+    def test_event_list(self):
+        """Test checks if the same page of events is answered with 304"""
+        response = self.client.get('/events/event/', {'page_size': 20})
+        self.assertNotModified('/events/event/', {'page_size': 20}, response['ETag'])
+
+        Event(name=f"Festival", date=self.event.date - timedelta(days=1)).save()
+        response = self.client.get('/events/event/', {'page_size': 20}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(len(response.json()['events']), 2)
+
+
+class ReplicaRouterTestCase(TestCase):
+    """Test case for the read replica database router"""
+
+    def handle(self, cookies=None, write=False):
+        """
+        Handles a request with a view reading from a replica.
+        :return: tuple (database used by reads of the view, response)
+        """
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        databases = []
+
+        @read_from_replica
+        def view():
+            databases.append(router.db_for_read(Event))
+            if write:
+                databases.append(router.db_for_write(Reservation))
+            return HttpResponse()
+
+        response = ReplicaStickinessMiddleware(lambda request: view())(request)
+        return databases[0], response
+
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+    def test_routing(self):
+        """Test checks if only the marked views read from the replicas and the clients see their own writes"""
+        database, response = self.handle()
+        self.assertIn(database, ['replica1', 'replica2'])
+        self.assertFalse(settings.REPLICA_STICKINESS_COOKIE in response.cookies)
+
+        # Reads outside of the marked views and all the writes use the primary database
+        self.assertEqual(router.db_for_read(Event), 'default')
+        self.assertEqual(router.db_for_write(Event), 'default')
+
+        # Client which wrote anything is pinned to the primary database
+        database, response = self.handle(write=True)
+        cookie = response.cookies[settings.REPLICA_STICKINESS_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_STICKINESS_SECONDS)
+
+        database, response = self.handle(cookies={settings.REPLICA_STICKINESS_COOKIE: cookie.value})
+        self.assertEqual(database, 'default')
+
+    def test_replica_reads_not_cached(self):
+        """Test checks that amounts of tickets left read from a replica are not shared through the cache"""
+        event = Event.objects.create(name="Concert", date=datetime.datetime.utcnow().replace(tzinfo=pytz.utc))
+        TicketType.objects.create(type="VIP", event=event, price=100, amount=50)
+        cache.delete(availability_cache_key(event.id))
+
+        with mock.patch('ticketonline.apps.events.availability.router') as availability_router:
+            availability_router.db_for_read.return_value = 'replica1'
+            self.assertEqual(get_ticket_availability(event.id)[0]['tickets_left'], 50)
+        self.assertIsNone(cache.get(availability_cache_key(event.id)))
+
+        get_ticket_availability(event.id)
+        self.assertIsNotNone(cache.get(availability_cache_key(event.id)))
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "No replicas configured (REPLICA_DATABASE_URLS)")
+class ReplicaReadYourWritesTestCase(TransactionTestCase):
+    """
+    Test case for reading from the replicas (test mirrors of the default database).
+    Data has to be committed to be visible through the replica connection, so the test is not run in a transaction.
+    """
+    databases = '__all__'
+
+    def test_read_your_writes(self):
+        """Test checks if the client which made a reservation reads the event details from the primary database"""
+        client = APIClient()
+        event = Event(name=f"Concert", date=datetime.datetime.utcnow().replace(tzinfo=pytz.utc) + timedelta(days=60))
+        event.save()
+        TicketType(type="VIP", event=event, price=100, amount=50).save()
+
+        response = client.post('/events/event/', {'event_id': str(event.id)}, format='json')
+        self.assertEqual(response.json()['ticket_types'][0]['tickets_left'], 50)
+
+        response = client.post('/events/reservation/', {'tickets': [{"type": "VIP", "amount": 2}],
+                                                        'event_id': str(event.id)}, format='json')
+        self.assertIn(settings.REPLICA_STICKINESS_COOKIE, response.cookies)
+
+        response = client.post('/events/event/', {'event_id': str(event.id)}, format='json')
+        self.assertEqual(response.json()['ticket_types'][0]['tickets_left'], 48)
+
+
+class DatabaseHealthCheckTestCase(TestCase):
+    """Test case for the health check of persistent database connections"""
+
+    @override_settings(CONN_HEALTH_CHECK_INTERVAL=10)
+    def test_check_connection(self):
+        """Test checks if the broken connections are closed and the recently used ones are not checked"""
+        connection = mock.Mock(connection=object(), in_atomic_block=False, last_used=100)
+        connection.is_usable.return_value = False
+
+        # Connection was used 5 seconds ago
+        check_connection(connection, 105)
+        connection.is_usable.assert_not_called()
+        connection.close.assert_not_called()
+
+        # Connection was not used for 20 seconds and the database closed it
+        check_connection(connection, 120)
+        connection.close.assert_called_once()
+
+        # Working connection is kept
+        connection = mock.Mock(connection=object(), in_atomic_block=False, last_used=None)
+        connection.is_usable.return_value = True
+        check_connection(connection, 120)
+        connection.close.assert_not_called()
+
+
+class ImportEventsTestCase(TestCase):
+    """ Test case for import_events command"""
+
+    CSV = (
+        "external_key,name,date,ticket_type,price,amount\n"
+        "rock-1,Rock concert,2030-06-01T20:00:00+00:00,VIP,100,10\n"
+        "rock-1,Rock concert,2030-06-01T20:00:00+00:00,Basic,20,500\n"
+        "jazz-1,Jazz night,2030-06-02T20:00:00,Basic,30,100\n"
+        "opera-1,Opera gala,next week,Basic,30,100\n"
+        "ballet-1,Ballet,2030-06-03T20:00:00,Basic,-5,100\n"
+    )
+
+    def import_file(self, content, suffix, **options):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+
+        output, errors = StringIO(), StringIO()
+        call_command('import_events', file.name, chunk_size=2, stdout=output, stderr=errors, **options)
+        return output.getvalue(), errors.getvalue()
+
+    def test_import_csv(self):
+        """Test checks that valid rows are imported and invalid ones are reported"""
+        output, errors = self.import_file(self.CSV, '.csv')
+        self.assertIn("Events created: 2, updated: 0. Ticket types created: 3, updated: 0. Invalid rows: 2.", output)
+        self.assertIn("Line 5: date has to be", errors)
+        self.assertIn("Line 6: price and amount of Basic tickets can not be negative", errors)
+
+        # Rows of the same event are merged even when they are saved in different chunks
+        event = Event.objects.get(external_key="rock-1")
+        self.assertEqual(sorted(event.ticket_types.values_list('type', 'amount')), [("Basic", 500), ("VIP", 10)])
+
+        # Imported events can be searched
+        response = APIClient().get('/events/search/', {'q': "jazz", 'page_size': 10}, format='json')
+        self.assertEqual(response.json()['events'][0]['name'], "Jazz night")
+
+    def test_import_csv_event_across_chunks(self):
+        """Test checks that the lines of an event are saved together even when they exceed the chunk"""
+        output, errors = self.import_file(
+            "external_key,name,date,ticket_type,price,amount\n"
+            "folk-1,Folk festival,2030-08-01T12:00:00,Basic,10,100\n"
+            "rock-1,Rock concert,2030-06-01T20:00:00,VIP,100,10\n"
+            "rock-1,Rock concert,2030-06-01T20:00:00,Basic,20,500\n"
+            "rock-1,Rock concert,2030-06-01T20:00:00,Gold,50,50\n"
+            "jazz-1,Jazz night,2030-06-02T20:00:00,Basic,30,100\n", '.csv')
+        self.assertIn("Events created: 3, updated: 0. Ticket types created: 5, updated: 0. Invalid rows: 0.", output)
+
+        event = Event.objects.get(external_key="rock-1")
+        self.assertEqual(sorted(event.ticket_types.values_list('type', flat=True)), ["Basic", "Gold", "VIP"])
+
+    def test_import_upsert(self):
+        """Test checks that existing events are updated only with --upsert"""
+        self.import_file(self.CSV, '.csv')
+        TicketType.objects.filter(event__external_key="jazz-1").update(amount_reserved=60)
+
+        jsonl = "\n".join(json.dumps(event) for event in [
+            {"external_key": "rock-1", "name": "Rock concert (moved)", "date": "2030-07-01T20:00:00+00:00",
+             "tickets": [{"type": "VIP", "price": 120, "amount": 20}, {"type": "Gold", "price": 60, "amount": 50}]},
+            {"external_key": "jazz-1", "name": "Jazz night", "date": "2030-06-02T20:00:00",
+             "tickets": [{"type": "Basic", "price": 30, "amount": 50}]},
+            {"external_key": "folk-1", "name": "Folk festival", "date": "2030-08-01T12:00:00"},
+        ])
+
+        output, errors = self.import_file(jsonl, '.jsonl')
+        self.assertIn("Events created: 1, updated: 0.", output)
+        self.assertIn("Event rock-1 already exists", errors)
+
+        output, errors = self.import_file(jsonl, '.jsonl', upsert=True)
+        self.assertIn("Events created: 0, updated: 2. Ticket types created: 1, updated: 1. Invalid rows: 1.", output)
+        self.assertIn("Amount of Basic tickets is lower than the amount already reserved", errors)
+
+        event = Event.objects.get(external_key="rock-1")
+        self.assertEqual(event.name, "Rock concert (moved)")
+        self.assertEqual(event.ticket_types.get(type="VIP").amount, 20)
+        self.assertEqual(event.ticket_types.count(), 3)
+        self.assertEqual(TicketType.objects.get(event__external_key="jazz-1").amount, 100)
+
+    def test_import_dry_run(self):
+        """Test checks that dry run validates the input without saving it"""
+        output, errors = self.import_file(self.CSV, '.csv', dry_run=True)
+        self.assertIn("Validated 5 rows", output)
+        self.assertIn("Events created: 2", output)
+        self.assertFalse(Event.objects.exists())
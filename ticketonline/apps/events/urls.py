@@ -5,8 +5,11 @@ from . import views
 
 router = routers.DefaultRouter()
 router.register('event', views.EventViewSet)
+router.register('search', views.EventSearchViewSet)
 router.register('reservation', views.ReservationViewSet)
+router.register('reservation-batch', views.ReservationBatchViewSet)
 router.register('stats', views.EventStatisticsViewSet)
+router.register('queue', views.WaitingRoomViewSet)
 
 urlpatterns = [
     url('', include(router.urls)),
@@ -1,19 +1,43 @@
 from rest_framework import viewsets
 from .serializers import EventSerializer, ReservationSerializer
+from .serializers import event_row_serializer, reservation_row_serializer
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.http import JsonResponse, HttpResponse
 from django.core.paginator import Paginator
 from ticketonline.decorators import log_exceptions
-from .models import Event, Reservation
-from ticketonline.apps.tickets.serializers import TicketTypeSerializer, OrderedTicketSerializer
-from django.db.models import Q
+from ticketonline.db_router import read_from_replica
+from ticketonline.serialization import FastJsonResponse
+from .models import Event, Reservation, WaitingRoom
+from ticketonline.apps.tickets.serializers import ordered_ticket_row_serializer
+from django.db.models import F, Sum, FloatField
+from django.db.models.functions import Coalesce
 from ticketonline.apps.tickets.models import TicketType, OrderedTicket
+from ticketonline.apps.tickets.utils.inventory import reserve_tickets, cancel_reservations, InsufficientTickets
+from django.db import transaction
+from django.conf import settings
 import datetime
+import uuid
 from datetime import timedelta
-from django.core.paginator import Paginator
+from .pagination import keyset_page
+from .search import search_events
+from .filters import filter_upcoming_events
+from .availability import get_ticket_availability, get_availability_summary, invalidate_ticket_availability
+from .reservation_tokens import create_reservation_token, read_reservation_token, InvalidReservationToken
+from .admission import issue_queue_token, queue_token_status, admit_queue_token, release_queue_token, \
+    InvalidQueueToken
+from .conditional import event_detail_etag, event_detail_last_modified, event_statistics_etag, \
+    event_statistics_last_modified, reservation_etag, conditional_content_response
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from ticketonline.apps.payments.tasks import process_reservation_payment
 from ticketonline.apps.payments.models import Transaction
 
+# Responses of the public endpoints can be cached by the clients and nginx for EVENTS_CACHE_MAX_AGE seconds,
+# after that they have to be revalidated with a conditional request
+public_cache = method_decorator(cache_control(public=True, max_age=settings.EVENTS_CACHE_MAX_AGE))
+private_cache = method_decorator(cache_control(private=True, no_cache=True))
+
 
 # Create your views here.
 class EventViewSet(viewsets.ModelViewSet):
@@ -22,38 +46,63 @@ class EventViewSet(viewsets.ModelViewSet):
     permission_classes = (AllowAny,)
 
     @log_exceptions("Error - could not get list of all events")
+    @read_from_replica
+    @public_cache
     def list(self, request):
         """
         Endpoint returns paginated list of all events available in the database.
+        Events can be paginated in one of two modes:
+        - with cursor (default) - returns the page of events following the given cursor
+        - with page number - used when current_page param is given
         Required params:
-        - current_page: number (starting from 1)
         - page_size: number
+        Optional params:
+        - cursor: string (next_cursor returned with the previous page, skip it to get the first page)
+        - current_page: number (starting from 1)
+        - from: date or date and time (ISO 8601) - the earliest date of the events
+        - to: date or date and time (ISO 8601) - the latest date of the events
+        - availability: 1 - adds the summary of tickets left to every event
         :param request:
         :return:
             - events: list - list of events
-            - last_page: number
+            - next_cursor: string or null - cursor of the next page (in cursor mode)
+            - last_page: number (in page number mode)
         """
         # Read the params
-        current_page = int(self.request.query_params.get('current_page'))
+        current_page = self.request.query_params.get('current_page')
         page_size = int(self.request.query_params.get('page_size'))
 
-        # Get all the events which will happen sorted from the earliest
-        now = datetime.datetime.now()
-        events = Event.objects.filter(date__gte=now).order_by('date')
-        events_serializer = EventSerializer(events, many=True)
-
-        # Setup paginator and get current page
-        paginator = Paginator(events_serializer.data, page_size)
-        page = paginator.get_page(current_page)
+        # Get all the events which will happen within given dates (only the serialized columns)
+        events = filter_upcoming_events(Event.objects.all(), self.request.query_params.get('from'),
+                                        self.request.query_params.get('to'))
+        events = event_row_serializer.values(events)
 
-        # Gather all the information and return
         return_data = dict()
-        return_data['events'] = page.object_list
-        return_data['last_page'] = paginator.num_pages
 
-        return JsonResponse(return_data)
+        if current_page is None:
+            # Fetch only the current page sorted from the earliest, starting after the cursor
+            page_events, next_cursor = keyset_page(events, page_size, self.request.query_params.get('cursor'))
+            return_data['events'] = event_row_serializer.serialize_many(page_events)
+            return_data['next_cursor'] = next_cursor
+        else:
+            # Setup paginator and get current page sorted from the earliest
+            # Paginator counts the events and fetches the current page only
+            paginator = Paginator(events.order_by('date', 'id'), page_size)
+            page = paginator.get_page(int(current_page))
+            return_data['events'] = event_row_serializer.serialize_many(page.object_list)
+            return_data['last_page'] = paginator.num_pages
+
+        # Summarize tickets left of all the events on the page at once
+        if self.request.query_params.get('availability') == '1':
+            summary = get_availability_summary([event['id'] for event in return_data['events']])
+            for event in return_data['events']:
+                event['availability'] = summary[event['id']]
+
+        # The list does not depend on a single event, so the ETag is computed from the content
+        return conditional_content_response(request, FastJsonResponse(return_data))
 
     @log_exceptions("Error - could not get info about the event")
+    @read_from_replica
     def create(self, request):
         """
         Endpoint returns detailed info about particular event based on given event id.
@@ -62,36 +111,77 @@ class EventViewSet(viewsets.ModelViewSet):
         :param request:
         :return: Event data, types of tickets, amount of tickets available
         """
+        return self.event_details(request.data['event_id'])
+
+    @log_exceptions("Error - could not get info about the event")
+    @read_from_replica
+    @public_cache
+    @method_decorator(condition(etag_func=event_detail_etag, last_modified_func=event_detail_last_modified))
+    def retrieve(self, request, pk=None):
+        """
+        Endpoint returns detailed info about particular event like create, but it can be cached.
+        Answers with 304 Not Modified when the event did not change since the ETag or the date given in
+        If-None-Match or If-Modified-Since header.
+        :param request:
+        :param pk: event id
+        :return: Event data, types of tickets, amount of tickets available
+        """
+        return self.event_details(pk)
+
+    def event_details(self, event_id):
         # Read event id and try to get particular event
-        event = Event.objects.get(id=request.data['event_id'])
+        event = event_row_serializer.values(Event.objects.filter(id=event_id)).get()
 
-        # Serialize event data
-        event_serializer = EventSerializer(event)
-        # Get all types of tickets and amount of available tickets
-        ticket_types = event.ticket_types.all()
-        ticket_type_serializer = TicketTypeSerializer(ticket_types, many=True)
+        # Get all types of tickets and amount of available tickets (shared between all requests through the cache)
+        ticket_types = get_ticket_availability(event['id'])
 
-        # Get all the ticket types
-        serialized_ticket_types = ticket_type_serializer.data
+        # Assign all the returned data to a variable
+        return_data = dict()
+        return_data['event'] = event_row_serializer.serialize(event)
+        return_data['ticket_types'] = ticket_types
 
-        # Initialize reserved tickets counters
-        ticket_counters = dict()
-        # Initialize counters for all ticket types
-        for ticket in serialized_ticket_types:
-            ticket_counters[ticket['type']] = event.tickets_ordered.filter(
-                Q(type=ticket['type'], reservation__status='PENDING') |
-                Q(type=ticket['type'], reservation__status='COMPLETED'), ).count()
+        return FastJsonResponse(return_data)
 
-        # Calculate final amount of tickets left for each ticket category
-        for ticket in serialized_ticket_types:
-            ticket['tickets_left'] = ticket['amount'] - ticket_counters[ticket['type']]
 
-        # Assign all the returned data to a variable
+class EventSearchViewSet(viewsets.GenericViewSet):
+    # Search is read-only, only the list action is routed
+    queryset = Event.objects.all()
+    permission_classes = (AllowAny,)
+
+    @log_exceptions("Error - could not search the events")
+    @read_from_replica
+    @public_cache
+    def list(self, request):
+        """
+        Endpoint returns upcoming events with the name similar to the searched phrase, from the most similar.
+        The last word of the phrase can be incomplete (autocomplete) and the words can contain typos.
+        Required params:
+            - q: string
+            - page_size: number
+        Optional params:
+            - current_page: number (starting from 1)
+        :param request:
+        :return:
+            - events: list - list of found events
+            - next_page: number or null - number of the next page
+        """
+        # Read the params
+        phrase = self.request.query_params.get('q', '')
+        page_size = int(self.request.query_params.get('page_size'))
+        current_page = int(self.request.query_params.get('current_page', 1))
+
+        if not phrase.strip():
+            return JsonResponse({"error": "Search phrase is required", "message": "Pass the searched phrase as q"})
+
+        # Fetch only the current page of the ranked events
+        events, has_next = search_events(phrase, page_size, current_page)
+
         return_data = dict()
-        return_data['event'] = event_serializer.data
-        return_data['ticket_types'] = ticket_type_serializer.data
+        return_data['events'] = event_row_serializer.serialize_many(events)
+        return_data['next_page'] = current_page + 1 if has_next else None
 
-        return JsonResponse(return_data)
+        # The results do not depend on a single event, so the ETag is computed from the content
+        return conditional_content_response(request, FastJsonResponse(return_data))
 
 
 class ReservationViewSet(viewsets.ModelViewSet):
@@ -100,34 +190,65 @@ class ReservationViewSet(viewsets.ModelViewSet):
     permission_classes = (AllowAny,)
 
     @log_exceptions("Error - could not get reservation data")
+    @private_cache
+    @method_decorator(condition(etag_func=reservation_etag))
     def list(self, request):
         """
         Endpoint returns detailed info about the reservation.
         Required payload:
             - reservation_id: string
+        Optional payload:
+            - detail: summary - returns a line per ticket type instead of every ticket
+            - include_tickets: 1 - returns every ticket in the summary mode as well
         :param request:
         :return: Reservation data and ticket data
         """
-        # Get reservation and serialize it
         reservation_id = self.request.query_params.get('reservation_id')
-        reservation = Reservation.objects.get(id=reservation_id)
-        reservation_serializer = ReservationSerializer(reservation)
+        if self.request.query_params.get('detail') == 'summary':
+            return self.reservation_summary(reservation_id, self.request.query_params.get('include_tickets') == '1')
+
+        # Get reservation along with its event
+        reservation = Reservation.objects.select_related('event').get(id=reservation_id)
 
         # Get tickets related to this reservation
-        tickets = reservation.tickets.all()
-        tickets_serializer = OrderedTicketSerializer(tickets, many=True)
+        tickets = ordered_ticket_row_serializer.values(reservation.tickets.all())
 
-        # Get event info
-        event = reservation.event
-        event_serializer = EventSerializer(event)
+        # Gather all the data and return
+        return_data = dict()
+        return_data['reservation'] = reservation_row_serializer.serialize(reservation)
+        return_data['tickets'] = ordered_ticket_row_serializer.serialize_many(tickets)
+        return_data['event'] = event_row_serializer.serialize(reservation.event)
+
+        return FastJsonResponse(return_data)
+
+    def reservation_summary(self, reservation_id, include_tickets=False):
+        # Get reservation, its event and the tickets grouped by type and price with a single query
+        rows = list(
+            Reservation.objects.filter(id=reservation_id)
+            .values(*reservation_row_serializer.columns, *event_row_serializer.related_columns('event'),
+                    'tickets__type', 'tickets__price')
+            .annotate(count=Sum('tickets__quantity'), subtotal=Sum(F('tickets__quantity') * F('tickets__price'),
+                                                                   output_field=FloatField()))
+            .order_by('tickets__type', 'tickets__price'))
+        if not rows:
+            raise Reservation.DoesNotExist(f"Reservation {reservation_id} does not exist")
+
+        # Reservation without tickets has a single row without ticket type
+        ticket_summary = [{"type": row['tickets__type'], "count": row['count'], "unit_price": row['tickets__price'],
+                           "subtotal": row['subtotal']} for row in rows if row['tickets__type'] is not None]
 
         # Gather all the data and return
         return_data = dict()
-        return_data['reservation'] = reservation_serializer.data
-        return_data['tickets'] = tickets_serializer.data
-        return_data['event'] = event_serializer.data
+        return_data['reservation'] = reservation_row_serializer.serialize(rows[0])
+        return_data['ticket_summary'] = ticket_summary
+        return_data['total'] = sum(line['subtotal'] for line in ticket_summary)
+        return_data['event'] = event_row_serializer.serialize_related(rows[0], 'event')
 
-        return JsonResponse(return_data)
+        if include_tickets:
+            tickets = ordered_ticket_row_serializer.values(OrderedTicket.objects.filter(reservation_id=reservation_id))
+            return_data['tickets'] = ordered_ticket_row_serializer.serialize_many(tickets)
+
+        return FastJsonResponse(return_data)
 
     @log_exceptions("Error - could not create a reservation for this event")
     def create(self, request):
@@ -139,6 +260,8 @@ class ReservationViewSet(viewsets.ModelViewSet):
             (example: [{"type":"VIP", "amount":3},{"type":"Basic", "amount": 1}])
 
             - event_id: string
+        Required payload for events with a waiting room:
+            - queue_token: string (admitted token returned by events/queue endpoint)
         :param request:
         :return:
             - ok / error string info
@@ -148,73 +271,115 @@ class ReservationViewSet(viewsets.ModelViewSet):
         event = Event.objects.get(id=request.data['event_id'])
         ordered_tickets = request.data['tickets']
 
-        # Gather ticket types assigned to this event
-        event_tickets = event.ticket_types.all()
-        # And save their types in a list
-        ticket_types = [t.type for t in event_tickets]
+        # Check if the user has been admitted by the waiting room of the event
+        queue_token_nonce = None
+        if WaitingRoom.objects.filter(event=event).exists():
+            try:
+                queue_token_nonce = admit_queue_token(request.data.get('queue_token'), event.id)
+            except InvalidQueueToken as e:
+                return JsonResponse({"error": "Not admitted by the waiting room", "message": e.args[0]})
+
+        new_reservation = None
+        try:
+            response, new_reservation = self.make_reservation(event, ordered_tickets)
+        finally:
+            # Queue token is used up only by a successful reservation, otherwise the user can try again
+            if queue_token_nonce is not None and new_reservation is None:
+                release_queue_token(queue_token_nonce)
+
+        return response
+
+    def make_reservation(self, event, ordered_tickets):
+        """
+        Method validates the order and reserves the tickets.
+        :return: tuple (response, new Reservation object or None if the reservation was not made)
+        """
+        # Gather ordered ticket types assigned to this event
+        # And save them in a dictionary by their type
+        ordered_types = [ticket['type'] for ticket in ordered_tickets]
+        event_tickets = {t.type: t for t in event.ticket_types.filter(type__in=ordered_types)}
 
         # Check if the ticket types are exactly as the ones defined by the event host
         for ticket in ordered_tickets:
-            if not ticket['type'] in ticket_types:
+            if not ticket['type'] in event_tickets:
                 return JsonResponse({"error": "Requested ticket type is not present in event ticket types",
-                                     "message": "This event does not distribute tickets of this type"})
+                                     "message": "This event does not distribute tickets of this type"}), None
 
-        # Check if the ticket amounts are not bigger than amount of available tickets
+        # Check if the ticket amounts are within allowed limits
         for ticket in ordered_tickets:
             # If there are more than 5 tickets of any type
             # Return error message
             if ticket['amount'] > 5:
                 return JsonResponse({"error": "Ordering more tickets than allowed!",
-                                     "message": "Can not order more than 5 tickets of each type"})
-
-            for event_ticket in event_tickets:
-                if event_ticket.type == ticket['type']:
-                    # Calculate tickets already bought and reserved
-                    tickets_already_ordered = event.tickets_ordered.filter(
-                        Q(type=ticket['type'], reservation__status='PENDING') |
-                        Q(type=ticket['type'], reservation__status='COMPLETED')).count()
+                                     "message": "Can not order more than 5 tickets of each type"}), None
 
-                    # If there's not enough tickets of certain type return error message
-                    if event_ticket.amount - tickets_already_ordered < ticket['amount']:
-                        return JsonResponse({"error": "Requested more tickets than available",
-                                             "message": f"This event does not have sufficient quantity of {ticket['type']} tickets"})
+            # Negative amount would give tickets back to the pool
+            if ticket['amount'] < 0:
+                return JsonResponse({"error": "Ordering less tickets than allowed!",
+                                     "message": "Can not order negative amount of tickets"}), None
 
         # Ticket types are correct
-        # There are enough tickets to buy
-        # Create reservation and ordered tickets to database
+        # Hold the tickets and create reservation and ordered tickets to database in one transaction
+        # so the tickets are given back when anything fails
         reservation_start = datetime.datetime.now()
         reservation_end = reservation_start + timedelta(minutes=15)
 
-        # Create new reservation with PENDING status
-        new_reservation = Reservation(event=event, reservation_date=reservation_start, pending_until=reservation_end)
-        new_reservation.save()
+        try:
+            with transaction.atomic():
+                # Check if there are enough tickets to buy and hold them
+                sold_out = reserve_tickets(event_tickets, ordered_tickets)
 
-        for ticket in ordered_tickets:
-            # Get the price for current ticket
-            ticket_price = event.ticket_types.filter(type=ticket['type'])[0].price
-            for i in range(ticket['amount']):
-                new_ticket = OrderedTicket(type=ticket['type'], event=event, reservation=new_reservation,
-                                           price=ticket_price)
-                new_ticket.save()
+                # Create new reservation with PENDING status
+                new_reservation = Reservation.objects.create(event=event, reservation_date=reservation_start,
+                                                             pending_until=reservation_end)
+
+                # Create one line with the amount and the current price for each ordered ticket type
+                # and insert all of them at once
+                OrderedTicket.objects.bulk_create([
+                    OrderedTicket(type=ticket['type'], event=event, reservation=new_reservation,
+                                  price=event_tickets[ticket['type']].price, quantity=ticket['amount'])
+                    for ticket in ordered_tickets if ticket['amount'] > 0
+                ])
+
+                # Amounts of tickets left have changed, the event itself changes only when a ticket type sold out
+                invalidate_ticket_availability([event.id], touch=sold_out)
 
-        # Setup session for 15 minutes
-        request.session['reservation_id'] = str(new_reservation.id)
-        request.session.set_expiry(900)
+        except InsufficientTickets as e:
+            # If there's not enough tickets of certain type return error message
+            return JsonResponse({
+                "error": "Requested more tickets than available",
+                "message": f"This event does not have sufficient quantity of {e.args[0]} tickets"}), None
 
-        return JsonResponse({"ok": "Reservation made successfully", "reservation_id": str(new_reservation.id),
-                             "message": "Reservation made successfully! Remember to finalize the payment within 15 miuntes from now"})
+        # Token valid for 15 minutes proves that the user made this reservation
+        reservation_token = create_reservation_token(new_reservation)
+
+        response = JsonResponse({"ok": "Reservation made successfully", "reservation_id": str(new_reservation.id),
+                                 "reservation_token": reservation_token,
+                                 "message": "Reservation made successfully! Remember to finalize the payment within 15 miuntes from now"})
+        return response, new_reservation
 
     @log_exceptions("Error - could not initialize the payment for the reservation")
     def put(self, request):
         """
         Endpoint handles payment simulation for given reservation.
-        Required params:
-            - reservation_id: string
+        Required payload:
+            - reservation_token: string (returned when the reservation was made)
+        With RESERVATION_ID_PAYMENT_FALLBACK enabled the reservation_id can be sent instead of the token.
         :param request:
         :return:
         """
+        # Reservation id is accepted only for the old clients during the migration to the tokens
+        if settings.RESERVATION_ID_PAYMENT_FALLBACK and 'reservation_token' not in request.data:
+            reservation_id = request.data['reservation_id']
+        else:
+            # Check if the token proves that the user made the reservation
+            try:
+                reservation_id = read_reservation_token(request.data.get('reservation_token'))
+            except InvalidReservationToken as e:
+                return JsonResponse({"error": "Invalid reservation token", "message": e.args[0]})
+
         # Get the reservation and its tickets
-        reservation = Reservation.objects.get(id=request.data['reservation_id'])
+        reservation = Reservation.objects.get(id=reservation_id)
 
         # Check reservation status
         if reservation.status != "PENDING":
@@ -222,17 +387,16 @@ class ReservationViewSet(viewsets.ModelViewSet):
                                  "message": "Status of this reservation does not allow to process a payment for it"})
 
         # Calculate total price for all the tickets
-        tickets = reservation.tickets.all()
-        total_amount = 0
-        for ticket in tickets:
-            total_amount += ticket.price
+        total_amount = reservation.tickets.aggregate(
+            total_amount=Coalesce(Sum(F('price') * F('quantity'), output_field=FloatField()), 0.0))['total_amount']
 
         # Initiate a new transaction
-        new_transaction = Transaction(amount=total_amount, reservation=reservation)
-        new_transaction.save()
+        new_transaction = Transaction.objects.create(amount=total_amount, reservation=reservation)
 
         # Setup worker to handle payment
-        process_reservation_payment.delay(reservation.id, new_transaction.id)
+        # In batch mode the transaction is picked up by one of process_payments workers
+        if settings.PAYMENT_WORKER_MODE == 'task':
+            process_reservation_payment.delay(reservation.id, new_transaction.id)
 
         return JsonResponse(
             {"ok": "Transaction started", "reservation_id": reservation.id, 'transaction_id': str(new_transaction.id),
@@ -242,27 +406,106 @@ class ReservationViewSet(viewsets.ModelViewSet):
     def delete(self, request):
         """
         Endpoint enables cancelling the reservation initiated by user.
+        Required payload:
+            - reservation_token: string (returned when the reservation was made)
         :param request:
         :return:
         """
-        # Check if user session contains proper reservation_id
-        reservation_id = request.session.pop('reservation_id', None)
+        # Check if the token proves that the user made the reservation
+        try:
+            reservation_id = read_reservation_token(request.data.get('reservation_token'))
+        except InvalidReservationToken as e:
+            return JsonResponse({"error": "Invalid reservation token", "message": e.args[0]})
 
-        # Cancel reservation
-        reservation = Reservation.objects.get(id=reservation_id)
-        reservation.status = 'CANCELLED'
-        reservation.save()
+        # Cancel reservation and give its tickets back
+        with transaction.atomic():
+            cancelled = cancel_reservations([reservation_id])
+
+        if not cancelled:
+            return JsonResponse({"error": "Reservation status is different than PENDING",
+                                 "message": "Status of this reservation does not allow to cancel it"})
 
         return JsonResponse(
             {"ok": "Reservation cancelled", "message": "Reservation for the event was cancelled successfully"})
 
 
+class ReservationBatchViewSet(viewsets.GenericViewSet):
+    # Reservations are read only by their ids, only the create action is routed
+    queryset = Reservation.objects.all()
+    permission_classes = (AllowAny,)
+
+    @log_exceptions("Error - could not get reservations data")
+    @private_cache
+    def create(self, request):
+        """
+        Endpoint returns detailed info about many reservations at once with a fixed number of queries.
+        Required payload:
+            - reservation_ids: list of strings (RESERVATION_BATCH_MAX_SIZE at most)
+        :param request:
+        :return:
+            - reservations: list - reservation data and ticket data of every found reservation in the given order
+            - events: dictionary - data of the events of the reservations by event id
+            - not_found: list - ids of the reservations which do not exist (or are not valid ids)
+        """
+        reservation_ids = request.data.get('reservation_ids')
+        if not isinstance(reservation_ids, list):
+            return JsonResponse({"error": "Invalid reservation ids",
+                                 "message": "Reservation ids have to be passed as a list"})
+
+        # Read the ids without duplicates keeping their order
+        reservation_ids = list(dict.fromkeys(str(reservation_id) for reservation_id in reservation_ids))
+        if len(reservation_ids) > settings.RESERVATION_BATCH_MAX_SIZE:
+            return JsonResponse({"error": "Too many reservations requested",
+                                 "message": f"Up to {settings.RESERVATION_BATCH_MAX_SIZE} reservations can be "
+                                            f"requested at once"})
+
+        # Ids which are not valid UUIDs can not belong to any reservation, they are reported as not found
+        valid_ids = dict()
+        for reservation_id in reservation_ids:
+            try:
+                valid_ids[reservation_id] = str(uuid.UUID(reservation_id))
+            except ValueError:
+                pass
+
+        # Get all the reservations along with their events
+        reservations = {str(reservation.id): reservation for reservation in
+                        Reservation.objects.select_related('event').filter(id__in=valid_ids.values())}
+
+        # Get tickets of all the reservations at once and group them by reservation
+        tickets = ordered_ticket_row_serializer.serialize_many(ordered_ticket_row_serializer.values(
+            OrderedTicket.objects.filter(reservation_id__in=reservations.keys())))
+        reservation_tickets = dict()
+        for ticket in tickets:
+            reservation_tickets.setdefault(ticket['reservation'], []).append(ticket)
+
+        # Gather all the data, every event is serialized once no matter how many reservations it has
+        return_data = {"reservations": [], "events": {}, "not_found": []}
+        for reservation_id in reservation_ids:
+            reservation = reservations.get(valid_ids.get(reservation_id))
+            if reservation is None:
+                return_data['not_found'].append(reservation_id)
+                continue
+
+            return_data['reservations'].append({
+                "reservation": reservation_row_serializer.serialize(reservation),
+                "tickets": reservation_tickets.get(str(reservation.id), []),
+            })
+            event_id = str(reservation.event_id)
+            if event_id not in return_data['events']:
+                return_data['events'][event_id] = event_row_serializer.serialize(reservation.event)
+
+        return FastJsonResponse(return_data)
+
+
 class EventStatisticsViewSet(viewsets.ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
     permission_classes = (AllowAny,)
 
     @log_exceptions("Error - could not get statistics for this event")
+    @read_from_replica
+    @public_cache
+    @method_decorator(condition(etag_func=event_statistics_etag, last_modified_func=event_statistics_last_modified))
     def list(self, request):
         """
         Endpoint returns statistics for given event.
@@ -274,27 +517,75 @@ class EventStatisticsViewSet(viewsets.ModelViewSet):
         """
         # Get event and serialize it
         event_id = self.request.query_params.get('event_id')
-        event = Event.objects.get(id=event_id)
-        event_serializer = EventSerializer(event)
+        event = event_row_serializer.values(Event.objects.filter(id=event_id)).get()
 
-        # Get all possible ticket types
-        ticket_types = TicketType.objects.filter(event=event)
-        ticket_types_list = [ticket.type for ticket in ticket_types]
+        # Get all possible ticket types along with their sales statistics
+        ticket_types = TicketType.objects.filter(event_id=event['id']).values('type', 'sales__sold')
 
         # Setup counters
         ticket_counters = {
-            "all_tickets_sold": event.tickets_ordered.filter(Q(reservation__status="COMPLETED")).count(),
+            "all_tickets_sold": 0,
             "ticket_types": {}
         }
 
-        # Count all sold tickets of each type
-        for ticket_type in ticket_types_list:
-            ticket_counters["ticket_types"][ticket_type] = event.tickets_ordered.filter(
-                Q(reservation__status="COMPLETED", type=ticket_type)).count()
+        # Read amount of sold tickets of each type (ticket types without statistics have not been sold yet)
+        for ticket in ticket_types:
+            ticket_counters["ticket_types"][ticket['type']] = ticket['sales__sold'] or 0
+            ticket_counters["all_tickets_sold"] += ticket['sales__sold'] or 0
 
         # Collect all the data and return it
         return_data = dict()
         return_data['ticket_counters'] = ticket_counters
-        return_data['event'] = event_serializer.data
+        return_data['event'] = event_row_serializer.serialize(event)
+
+        return FastJsonResponse(return_data)
+
+
+class WaitingRoomViewSet(viewsets.GenericViewSet):
+    # Waiting rooms are managed in the admin panel, only joining the queue and the token status are routed
+    queryset = WaitingRoom.objects.all()
+    permission_classes = (AllowAny,)
+
+    @log_exceptions("Error - could not get the queue token status")
+    def list(self, request):
+        """
+        Endpoint returns the state of the queue token.
+        Required params:
+            - queue_token: string
+        :param request:
+        :return:
+            - admitted: bool - whether the token can be used to make a reservation
+            - expired: bool - whether the time to use admitted token has passed
+            - position: number - approximate amount of users in the queue ahead
+            - estimated_wait: number - seconds left to admission
+        """
+        try:
+            status = queue_token_status(self.request.query_params.get('queue_token'))
+        except InvalidQueueToken as e:
+            return JsonResponse({"error": "Invalid queue token", "message": e.args[0]})
+
+        return JsonResponse({key: status[key] for key in ('admitted', 'expired', 'position', 'estimated_wait')})
+
+    @log_exceptions("Error - could not join the waiting room")
+    def create(self, request):
+        """
+        Endpoint puts the user at the end of the event waiting room queue.
+        Required payload:
+            - event_id: string
+        :param request:
+        :return:
+            - queue_token: string - token to be passed with the reservation once it is admitted
+            - admitted, expired, position, estimated_wait - state of the token
+        """
+        event_id = request.data['event_id']
+        if not WaitingRoom.objects.filter(event_id=event_id).exists():
+            return JsonResponse({"error": "Event does not have a waiting room",
+                                 "message": "Reservations for this event can be made without a queue token"})
+
+        queue_token = issue_queue_token(event_id)
+        status = queue_token_status(queue_token)
+
+        return_data = {key: status[key] for key in ('admitted', 'expired', 'position', 'estimated_wait')}
+        return_data['queue_token'] = queue_token
 
         return JsonResponse(return_data)
@@ -0,0 +1,56 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ticketonline.apps.payments.tasks import process_pending_transactions, process_pending_transactions_async
+from ticketonline.apps.payments.utils.payment_gateway import AsyncPaymentGateway, SimulatedLatencyGateway
+
+
+class Command(BaseCommand):
+    help = "Runs a payment worker which processes PENDING transactions in batches (PAYMENT_WORKER_MODE=batch)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Amount of transactions claimed at once (PAYMENT_BATCH_SIZE by default)")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to wait when there are no transactions to process")
+        parser.add_argument('--once', action='store_true',
+                            help="Process all the PENDING transactions and exit")
+        parser.add_argument('--async', action='store_true', dest='use_async',
+                            help="Charge all the transactions of a batch concurrently on a single event loop")
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Maximum amount of concurrent gateway requests in async mode "
+                                 "(PAYMENT_GATEWAY_CONCURRENCY by default)")
+        parser.add_argument('--timeout', type=float, default=None,
+                            help="Seconds to wait for the gateway in async mode (PAYMENT_GATEWAY_TIMEOUT by default)")
+        parser.add_argument('--simulated-latency', type=float, default=None,
+                            help="Use in-process gateway answering after this many seconds (async mode only)")
+
+    def handle(self, *args, **options):
+        if options['use_async']:
+            gateway_options = dict(
+                max_concurrency=options['concurrency'] or settings.PAYMENT_GATEWAY_CONCURRENCY,
+                timeout=options['timeout'] or settings.PAYMENT_GATEWAY_TIMEOUT,
+            )
+            if options['simulated_latency'] is not None:
+                gateway = SimulatedLatencyGateway(latency=options['simulated_latency'], **gateway_options)
+            else:
+                gateway = AsyncPaymentGateway(**gateway_options)
+
+            def process():
+                return process_pending_transactions_async(options['batch_size'], gateway)
+        else:
+            def process():
+                return process_pending_transactions(options['batch_size'])
+
+        while True:
+            started = time.monotonic()
+            processed = process()
+            if processed:
+                duration = time.monotonic() - started
+                self.stdout.write(f"Processed {processed} transactions in {duration:.2f}s "
+                                  f"({processed / duration:.1f} transactions/s)")
+
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['poll_interval'])
@@ -17,6 +17,7 @@ class Transaction(models.Model):
     STATUS = (
         ('COMPLETED', 'COMPLETED'),
         ('PENDING', 'PENDING'),
+        ('PROCESSING', 'PROCESSING'),
         ('ERROR', 'ERROR'),
     )
 
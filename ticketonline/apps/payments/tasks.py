@@ -1,11 +1,49 @@
 from ticketonline.celery import app
-from .utils.payment_gateway import PaymentGateway
+from .utils.payment_gateway import PaymentGateway, AsyncPaymentGateway
 from ticketonline.apps.events.models import Reservation
+from ticketonline.apps.tickets.utils.inventory import complete_reservations
+from django.conf import settings
+from django.db import transaction
+import asyncio
 import random
 from .utils.payment_gateway import CurrencyError, PaymentError, CardError
+from .utils.status_channel import publish_transaction_status
 from .models import Transaction
 
 
+# Error of the payments charged for reservations which expired or were cancelled while the gateway was charging them
+REFUND_REQUIRED = "Reservation expired during the payment, the payment has to be refunded"
+
+
+def random_token():
+    """
+    Function generates a random token to simulate different cases of the payment.
+    """
+    return random.choice(['card_error', 'payment_error', 'transaction_ok'])
+
+
+def charge_transaction(gateway, payment):
+    """
+    Function passes the amount of the transaction to the gateway and sets transaction status accordingly.
+    Transaction is not saved.
+    :param gateway: payment gateway
+    :param payment: Transaction object
+    :return: True if the payment was successful
+    """
+    # Handle any possible exception
+    try:
+        # Process the payment
+        gateway.charge(payment.amount, random_token())
+    except (CurrencyError, PaymentError, CardError) as e:
+        # Add transaction error
+        payment.status = 'ERROR'
+        payment.error_type = e.args[0]
+        return False
+
+    payment.status = 'COMPLETED'
+    return True
+
+
 @app.task
 def process_reservation_payment(reservation_id, transaction_id):
     """
@@ -21,29 +59,168 @@ def process_reservation_payment(reservation_id, transaction_id):
     # Get reservation
     reservation = Reservation.objects.get(id=reservation_id)
 
-    # generate a random token to simulate different cases
-    tokens = ['card_error', 'payment_error', 'transaction_ok']
-    random_token = tokens[random.randint(0, len(tokens))]
-
     # Initiate the new transaction
     new_transaction = Transaction.objects.get(id=transaction_id)
 
-    # Pass amount to the gateway along with random token
-    # Handle any possible exception
-    try:
-        # Process the payment
-        gateway.charge(new_transaction.amount, random_token)
-    except (CurrencyError, PaymentError, CardError) as e:
-        # Add transaction error
+    # Do not charge for reservations which expired or were cancelled in the meantime
+    if reservation.status != 'PENDING':
         new_transaction.status = 'ERROR'
-        new_transaction.error_type = e.args[0]
+        new_transaction.error_type = "Reservation is not pending anymore"
         new_transaction.save()
 
-    else:
-        # Add successfull transaction
-        # And change reservation status
-        new_transaction.status = 'COMPLETED'
+    # Pass amount to the gateway
+    elif not charge_transaction(gateway, new_transaction):
         new_transaction.save()
 
-        reservation.status = 'COMPLETED'
-        reservation.save()
+    else:
+        # Change reservation status (which also updates ticket sales statistics) and add successfull transaction
+        with transaction.atomic():
+            # Reservation could expire or be cancelled while the gateway was charging, then its tickets are gone
+            if not complete_reservations([reservation.id]):
+                new_transaction.status = 'ERROR'
+                new_transaction.error_type = REFUND_REQUIRED
+
+            new_transaction.save()
+
+    # Notify clients waiting for the transaction
+    publish_transaction_status([new_transaction])
+
+
+def process_transaction_batches(batch_size, charge_batch):
+    """
+    Function processes all the PENDING transactions batch by batch.
+    Every batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED and marked as PROCESSING in a short transaction,
+    so many workers can run at the same time and each of them processes different transactions.
+    The gateway is called outside of any transaction (no rows are locked while charging), then the results
+    of the whole batch are saved at once in another short transaction.
+    Transactions charged when an unexpected error stopped the batch keep their results, the others stay PROCESSING
+    (they are never charged twice and have to be checked with the gateway).
+    :param batch_size: amount of transactions claimed at once
+    :param charge_batch: function which charges given list of transactions, sets their statuses
+    and returns the list of successfully paid ones
+    :return: amount of processed transactions
+    """
+    processed = 0
+
+    while True:
+        with transaction.atomic():
+            # Claim the oldest transactions which are not being processed by other workers
+            claimed = list(Transaction.objects.select_for_update(skip_locked=True)
+                           .filter(status='PENDING').order_by('date')[:batch_size])
+
+            # Get statuses of all the reservations in the batch at once
+            reservation_statuses = dict(Reservation.objects.filter(
+                id__in=[payment.reservation_id for payment in claimed]).values_list('id', 'status'))
+
+            payable = []
+            payable_reservations = set()
+            for payment in claimed:
+                # Do not charge for reservations which expired, were cancelled or are already being paid
+                if reservation_statuses.get(payment.reservation_id) != 'PENDING' \
+                        or payment.reservation_id in payable_reservations:
+                    payment.status = 'ERROR'
+                    payment.error_type = "Reservation is not pending anymore"
+                else:
+                    payment.status = 'PROCESSING'
+                    payable.append(payment)
+                    payable_reservations.add(payment.reservation_id)
+
+            Transaction.objects.bulk_update(claimed, ['status', 'error_type'])
+
+        try:
+            paid = charge_batch(payable)
+        except Exception:
+            # Save the results of the transactions charged before the error
+            save_charged_transactions([payment for payment in payable if payment.status != 'PROCESSING'],
+                                      [payment for payment in payable if payment.status == 'COMPLETED'])
+            raise
+
+        save_charged_transactions(payable, paid)
+
+        # Notify clients waiting for the transactions
+        publish_transaction_status(claimed)
+
+        processed += len(claimed)
+        if len(claimed) < batch_size:
+            break
+
+    return processed
+
+
+def save_charged_transactions(charged, paid):
+    """
+    Function completes the reservations of paid transactions and saves the results of the charged transactions.
+    :param charged: list of charged Transaction objects with their new statuses
+    :param paid: list of successfully paid Transaction objects
+    """
+    with transaction.atomic():
+        # Reservations could expire or be cancelled while the gateway was charging, then their tickets are gone
+        completed = set(complete_reservations([payment.reservation_id for payment in paid]))
+        for payment in paid:
+            if payment.reservation_id not in completed:
+                payment.status = 'ERROR'
+                payment.error_type = REFUND_REQUIRED
+
+        Transaction.objects.bulk_update(charged, ['status', 'error_type'])
+
+
+@app.task
+def process_pending_transactions(batch_size=None):
+    """
+    Task is an alternative payment worker which processes all the PENDING transactions in batches,
+    charging transactions of a batch one by one.
+    :param batch_size: amount of transactions claimed at once (PAYMENT_BATCH_SIZE by default)
+    :return: amount of processed transactions
+    """
+    gateway = PaymentGateway()
+
+    def charge_batch(payments):
+        return [payment for payment in payments if charge_transaction(gateway, payment)]
+
+    return process_transaction_batches(batch_size or settings.PAYMENT_BATCH_SIZE, charge_batch)
+
+
+async def charge_transaction_async(gateway, payment):
+    """
+    Function passes the amount of the transaction to the asynchronous gateway and sets transaction status accordingly.
+    Transaction is not saved.
+    :param gateway: asynchronous payment gateway
+    :param payment: Transaction object
+    :return: True if the payment was successful
+    """
+    try:
+        await gateway.charge(payment.amount, random_token())
+    except (CurrencyError, PaymentError, CardError) as e:
+        payment.status = 'ERROR'
+        payment.error_type = e.args[0]
+        return False
+
+    payment.status = 'COMPLETED'
+    return True
+
+
+def process_pending_transactions_async(batch_size=None, gateway=None):
+    """
+    Function processes all the PENDING transactions in batches, charging all the transactions of a batch
+    concurrently on a single event loop. Amount of payments processed at once is limited by the gateway.
+    :param batch_size: amount of transactions claimed at once (PAYMENT_BATCH_SIZE by default)
+    :param gateway: asynchronous payment gateway (AsyncPaymentGateway configured from the settings by default)
+    :return: amount of processed transactions
+    """
+    if gateway is None:
+        gateway = AsyncPaymentGateway(settings.PAYMENT_GATEWAY_CONCURRENCY, settings.PAYMENT_GATEWAY_TIMEOUT)
+
+    async def charge_all(payments):
+        results = await asyncio.gather(*[charge_transaction_async(gateway, payment) for payment in payments])
+        return [payment for payment, paid in zip(payments, results) if paid]
+
+    # All the batches are charged on the same event loop
+    loop = asyncio.new_event_loop()
+
+    def charge_batch(payments):
+        return loop.run_until_complete(charge_all(payments))
+
+    try:
+        return process_transaction_batches(batch_size or settings.PAYMENT_BATCH_SIZE, charge_batch)
+    finally:
+        loop.close()
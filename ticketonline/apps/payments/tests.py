@@ -1,14 +1,24 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from unittest import mock
 from rest_framework.test import APIClient
 from .models import Transaction
+from .tasks import process_pending_transactions, process_pending_transactions_async, process_reservation_payment
+from .tasks import REFUND_REQUIRED
+from .utils.payment_gateway import SimulatedLatencyGateway, PaymentError, PaymentGateway
+from .utils.status_channel import publish_transaction_status
+from ticketonline.testing import QueryBudgetMixin
+import asyncio
+import threading
+import time
 from ticketonline.apps.events.models import Event, Reservation
 import datetime
 import pytz
 from datetime import timedelta
 from ticketonline.apps.tickets.models import TicketType, OrderedTicket
+from ticketonline.apps.tickets.utils.inventory import cancel_reservations
 
 
-class TransactionTestCase(TestCase):
+class TransactionTestCase(QueryBudgetMixin, TestCase):
     """ Test case for transactions/list endpoint"""
 
     def setUp(self):
@@ -41,16 +51,19 @@ class TransactionTestCase(TestCase):
                                     ], 'event_id': str(self.event.id)},
                                     format='json')
 
-        # Save returned reservation_id
-        reservation_id = response.json()['reservation_id']
+        # Save returned reservation_token
+        reservation_token = response.json()['reservation_token']
 
         # Call endpoint to pay for the tickets
-        response = self.client.put('/events/reservation/', {'reservation_id': reservation_id}, format='json')
+        response = self.client.put('/events/reservation/', {'reservation_token': reservation_token}, format='json')
         self.assertEqual(response.status_code, 200)
         self.assertTrue('transaction_id' in response.json())
 
         transaction_id = response.json()['transaction_id']
 
+        # Transaction amount is the total price of all the tickets
+        self.assertEqual(Transaction.objects.get(id=transaction_id).amount, 380)
+
         # Test if the transaction status changes
         response = self.client.get('/transactions/list/', {'transaction_id': transaction_id}, format='json')
         self.assertEqual(response.status_code, 200)
@@ -59,3 +72,218 @@ class TransactionTestCase(TestCase):
         possible_status_values = ['COMPLETED', 'ERROR']
         print(response.json())
         self.assertTrue(response.json()['status'] in possible_status_values)
+
+    def test_payment_requires_reservation_token(self):
+        """Test checks that the reservation can be paid by its id only with the temporary compatibility setting"""
+        response = self.client.post('/events/reservation/',
+                                    {'tickets': [{"type": "VIP", "amount": 1}], 'event_id': str(self.event.id)},
+                                    format='json')
+        reservation_id = response.json()['reservation_id']
+
+        response = self.client.put('/events/reservation/', {'reservation_id': reservation_id}, format='json')
+        self.assertEqual(response.json()['error'], "Invalid reservation token")
+        self.assertFalse(Transaction.objects.filter(reservation_id=reservation_id).exists())
+
+        with self.settings(RESERVATION_ID_PAYMENT_FALLBACK=True):
+            response = self.client.put('/events/reservation/', {'reservation_id': reservation_id}, format='json')
+        self.assertTrue('transaction_id' in response.json())
+
+    @override_settings(PAYMENT_WORKER_MODE='batch')
+    def test_reservation_expired_during_payment(self):
+        """Test checks that the payment is not completed when the reservation expires while it is being charged"""
+        response = self.client.post('/events/reservation/',
+                                    {'tickets': [{"type": "VIP", "amount": 2}], 'event_id': str(self.event.id)},
+                                    format='json')
+        reservation_id = response.json()['reservation_id']
+        response = self.client.put('/events/reservation/', {'reservation_token': response.json()['reservation_token']},
+                                   format='json')
+        transaction_id = response.json()['transaction_id']
+
+        def charge_while_expiring(*args, **kwargs):
+            cancel_reservations([reservation_id])
+
+        with mock.patch('ticketonline.apps.payments.tasks.random_token', return_value='transaction_ok'), \
+                mock.patch('ticketonline.apps.payments.tasks.PaymentGateway.charge', side_effect=charge_while_expiring):
+            process_reservation_payment(reservation_id, transaction_id)
+
+        payment = Transaction.objects.get(id=transaction_id)
+        self.assertEqual((payment.status, payment.error_type), ('ERROR', REFUND_REQUIRED))
+        self.assertEqual(Reservation.objects.get(id=reservation_id).status, 'CANCELLED')
+        self.assertEqual(TicketType.objects.get(event=self.event, type="VIP").amount_reserved, 0)
+
+    @override_settings(PAYMENT_WORKER_MODE='batch')
+    def test_batch_payment_worker(self):
+        """Test checks if the batch worker processes all the pending transactions"""
+        # Create 3 reservations and start payments for them
+        transaction_ids = []
+        for i in range(3):
+            response = self.client.post('/events/reservation/',
+                                        {'tickets': [{"type": "VIP", "amount": 1}], 'event_id': str(self.event.id)},
+                                        format='json')
+            response = self.client.put('/events/reservation/',
+                                       {'reservation_token': response.json()['reservation_token']}, format='json')
+            transaction_ids.append(response.json()['transaction_id'])
+
+        # Transactions wait for the worker
+        self.assertEqual(Transaction.objects.filter(id__in=transaction_ids, status='PENDING').count(), 3)
+
+        # Process them in batches of 2
+        with mock.patch('ticketonline.apps.payments.tasks.random_token', return_value='transaction_ok'):
+            self.assertEqual(process_pending_transactions(batch_size=2), 3)
+
+        self.assertEqual(Transaction.objects.filter(id__in=transaction_ids, status='COMPLETED').count(), 3)
+        self.assertEqual(Reservation.objects.filter(event=self.event, status='COMPLETED').count(), 3)
+
+    @override_settings(PAYMENT_WORKER_MODE='batch')
+    def test_batch_reservation_expired_during_payment(self):
+        """Test checks that the batch worker does not complete payments of reservations which expired meanwhile"""
+        reservation_ids, transaction_ids = [], []
+        for i in range(3):
+            response = self.client.post('/events/reservation/',
+                                        {'tickets': [{"type": "VIP", "amount": 1}], 'event_id': str(self.event.id)},
+                                        format='json')
+            reservation_ids.append(response.json()['reservation_id'])
+            response = self.client.put('/events/reservation/',
+                                       {'reservation_token': response.json()['reservation_token']}, format='json')
+            transaction_ids.append(response.json()['transaction_id'])
+
+        # The first reservation expires while the batch is being charged
+        charge = PaymentGateway.charge
+
+        def charge_while_expiring(gateway, *args, **kwargs):
+            cancel_reservations([reservation_ids[0]])
+            return charge(gateway, *args, **kwargs)
+
+        with mock.patch('ticketonline.apps.payments.tasks.random_token', return_value='transaction_ok'), \
+                mock.patch.object(PaymentGateway, 'charge', charge_while_expiring):
+            self.assertEqual(process_pending_transactions(), 3)
+
+        statuses = [Transaction.objects.get(id=transaction_id).status for transaction_id in transaction_ids]
+        self.assertEqual(statuses, ['ERROR', 'COMPLETED', 'COMPLETED'])
+        self.assertEqual(Transaction.objects.get(id=transaction_ids[0]).error_type, REFUND_REQUIRED)
+        self.assertEqual(Reservation.objects.get(id=reservation_ids[0]).status, 'CANCELLED')
+
+    @override_settings(PAYMENT_WORKER_MODE='batch')
+    def test_batch_worker_error_while_charging(self):
+        """Test checks that transactions charged before an unexpected error are saved and never charged again"""
+        transaction_ids = []
+        for i in range(3):
+            response = self.client.post('/events/reservation/',
+                                        {'tickets': [{"type": "VIP", "amount": 1}], 'event_id': str(self.event.id)},
+                                        format='json')
+            response = self.client.put('/events/reservation/',
+                                       {'reservation_token': response.json()['reservation_token']}, format='json')
+            transaction_ids.append(response.json()['transaction_id'])
+
+        # Gateway fails unexpectedly on the second payment, the batch is marked as PROCESSING while charging
+        charge = PaymentGateway.charge
+        charged_statuses = []
+
+        def failing_charge(gateway, *args, **kwargs):
+            charged_statuses.append(set(Transaction.objects.values_list('status', flat=True)))
+            if len(charged_statuses) == 2:
+                raise ConnectionError("Gateway is not available")
+            return charge(gateway, *args, **kwargs)
+
+        with mock.patch('ticketonline.apps.payments.tasks.random_token', return_value='transaction_ok'), \
+                mock.patch.object(PaymentGateway, 'charge', failing_charge):
+            with self.assertRaises(ConnectionError):
+                process_pending_transactions()
+            self.assertEqual(charged_statuses[0], {'PROCESSING'})
+
+            # Next run does not charge any of them again
+            self.assertEqual(process_pending_transactions(), 0)
+        self.assertEqual(len(charged_statuses), 2)
+
+        statuses = [Transaction.objects.get(id=transaction_id).status for transaction_id in transaction_ids]
+        self.assertEqual(statuses, ['COMPLETED', 'PROCESSING', 'PROCESSING'])
+        self.assertEqual(Reservation.objects.filter(event=self.event, status='COMPLETED').count(), 1)
+
+    @override_settings(PAYMENT_WORKER_MODE='batch')
+    def test_async_payment_worker(self):
+        """Test checks if the async worker charges transactions concurrently"""
+        # Create 4 reservations and start payments for them
+        for i in range(4):
+            response = self.client.post('/events/reservation/',
+                                        {'tickets': [{"type": "Gold", "amount": 1}], 'event_id': str(self.event.id)},
+                                        format='json')
+            self.client.put('/events/reservation/', {'reservation_token': response.json()['reservation_token']},
+                            format='json')
+
+        # Every payment takes 0.2s, all of them are processed at once
+        gateway = SimulatedLatencyGateway(latency=0.2, max_concurrency=4)
+        started = time.monotonic()
+        with mock.patch('ticketonline.apps.payments.tasks.random_token', return_value='transaction_ok'):
+            self.assertEqual(process_pending_transactions_async(gateway=gateway), 4)
+
+        self.assertTrue(time.monotonic() - started < 0.6)
+        self.assertEqual(Transaction.objects.filter(status='COMPLETED').count(), 4)
+
+    def test_async_gateway_timeout(self):
+        """Test checks if the async gateway stops waiting for the payment after the timeout"""
+        gateway = SimulatedLatencyGateway(latency=1, timeout=0.05)
+        with self.assertRaises(PaymentError):
+            asyncio.run(gateway.charge(100, 'transaction_ok'))
+
+    @override_settings(PAYMENT_WORKER_MODE='batch', TRANSACTION_STATUS_POLL_INTERVAL=0.01)
+    def test_wait_for_transaction_status(self):
+        """Test checks if the endpoint waits for the transaction status change"""
+        response = self.client.post('/events/reservation/',
+                                    {'tickets': [{"type": "VIP", "amount": 1}], 'event_id': str(self.event.id)},
+                                    format='json')
+        response = self.client.put('/events/reservation/', {'reservation_token': response.json()['reservation_token']},
+                                   format='json')
+        transaction_id = response.json()['transaction_id']
+
+        # Transaction is not processed within given time
+        started = time.monotonic()
+        response = self.client.get('/transactions/list/', {'transaction_id': transaction_id, 'wait': 0.2})
+        self.assertEqual(response.json()['status'], 'PENDING')
+        self.assertTrue(time.monotonic() - started >= 0.2)
+
+        # Process the transaction in the background while the client waits
+        payment = Transaction.objects.get(id=transaction_id)
+        payment.status = 'COMPLETED'
+
+        def process():
+            time.sleep(0.1)
+            publish_transaction_status([payment])
+
+        worker = threading.Thread(target=process)
+        worker.start()
+        response = self.client.get('/transactions/list/', {'transaction_id': transaction_id, 'wait': 5})
+        worker.join()
+        self.assertEqual(response.json()['status'], 'COMPLETED')
+
+        # Wait is capped, so the request does not hold the server thread for long
+        payment = Transaction.objects.create(amount=100, reservation=payment.reservation)
+        started = time.monotonic()
+        with override_settings(TRANSACTION_WAIT_MAX=0.2):
+            response = self.client.get('/transactions/list/', {'transaction_id': str(payment.id), 'wait': 60})
+        self.assertEqual(response.json()['status'], 'PENDING')
+        self.assertTrue(time.monotonic() - started < 2)
+
+    @override_settings(PAYMENT_WORKER_MODE='batch')
+    def test_query_budget(self):
+        """Test checks that transaction status and the batch worker stay within their budget of SQL queries"""
+        # Create many paid reservations
+        transaction_ids = []
+        for i in range(150):
+            client = APIClient()
+            response = client.post('/events/reservation/',
+                                   {'tickets': [{"type": "Silver", "amount": 2}], 'event_id': str(self.event.id)},
+                                   format='json')
+            response = client.put('/events/reservation/', {'reservation_token': response.json()['reservation_token']},
+                                  format='json')
+            transaction_ids.append(response.json()['transaction_id'])
+
+        with self.assertQueryBudget(1, 1, "transaction status"):
+            response = APIClient().get('/transactions/list/', {'transaction_id': transaction_ids[0]})
+        self.assertEqual(response.json()['status'], 'PENDING')
+
+        # Amount of queries depends on the amount of batches (2), not on the amount of transactions
+        # (claiming and saving the results are separate transactions)
+        # Every transaction fetches at most itself, status of its reservation and the reservation to complete
+        with self.assertQueryBudget(2 * 17, 3 * 150 + 10, "batch payment worker"):
+            process_pending_transactions(batch_size=100)
+        self.assertFalse(Transaction.objects.filter(status='PENDING').exists())
@@ -1,3 +1,6 @@
+import asyncio
+import random
+import weakref
 from collections import namedtuple
 
 
@@ -28,3 +31,51 @@ class PaymentGateway:
             raise CurrencyError(f"Currency {currency} not supported")
         else:
             return PaymentResult(amount, currency)
+
+
+class AsyncPaymentGateway:
+    """
+    Asynchronous version of the payment gateway, so many payments can wait for the gateway at the same time.
+    At most max_concurrency payments are processed at once and every one of them fails with PaymentError
+    if the gateway does not respond within timeout seconds.
+    """
+    supported_currencies = PaymentGateway.supported_currencies
+
+    def __init__(self, max_concurrency=50, timeout=10):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.gateway = PaymentGateway()
+        self.semaphores = weakref.WeakKeyDictionary()
+
+    def semaphore(self):
+        # Semaphore has to be created within the event loop it is used in
+        loop = asyncio.get_running_loop()
+        if loop not in self.semaphores:
+            self.semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return self.semaphores[loop]
+
+    async def charge(self, amount, token, currency='EUR'):
+        async with self.semaphore():
+            try:
+                return await asyncio.wait_for(self.request(amount, token, currency), self.timeout)
+            except asyncio.TimeoutError:
+                raise PaymentError("Payment gateway did not respond in time")
+
+    async def request(self, amount, token, currency):
+        return self.gateway.charge(amount, token, currency)
+
+
+class SimulatedLatencyGateway(AsyncPaymentGateway):
+    """
+    In-process stand-in for a real gateway which answers after latency (plus random jitter) seconds.
+    Used to measure payment workers throughput locally.
+    """
+
+    def __init__(self, latency=0.2, jitter=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.jitter = jitter
+
+    async def request(self, amount, token, currency):
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        return await super().request(amount, token, currency)
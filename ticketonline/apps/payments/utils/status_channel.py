@@ -0,0 +1,38 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+
+def transaction_status_key(transaction_id):
+    return f"transaction-status:{transaction_id}"
+
+
+def publish_transaction_status(transactions):
+    """
+    Function notifies clients waiting for the transactions that their status has changed.
+    It has to be called after the new status is committed to the database.
+    :param transactions: list of processed Transaction objects
+    """
+    cache.set_many({
+        transaction_status_key(payment.id): {"status": payment.status, "transaction_error": payment.error_type}
+        for payment in transactions
+    }, settings.TRANSACTION_STATUS_TIMEOUT)
+
+
+def wait_for_transaction_status(transaction_id, timeout):
+    """
+    Function waits until the transaction is processed by the payment worker.
+    It checks only the cache key set by publish_transaction_status, so waiting does not query the database.
+    :param transaction_id: id of the transaction
+    :param timeout: maximum time to wait in seconds
+    :return: dictionary with status and transaction_error or None if the transaction was not processed in time
+    """
+    key = transaction_status_key(transaction_id)
+    deadline = time.monotonic() + timeout
+
+    while True:
+        status = cache.get(key)
+        if status is not None or time.monotonic() >= deadline:
+            return status
+
+        time.sleep(min(settings.TRANSACTION_STATUS_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
@@ -4,6 +4,8 @@ from .serializers import TransactionSerializer
 from ticketonline.decorators import log_exceptions
 from rest_framework import viewsets
 from django.http import JsonResponse
+from django.conf import settings
+from .utils.status_channel import wait_for_transaction_status
 
 
 class TransactionViewSet(viewsets.ModelViewSet):
@@ -15,8 +17,13 @@ class TransactionViewSet(viewsets.ModelViewSet):
     def list(self, request):
         """
         Endpoint checks status of the transaction with given id.
+        When wait param is given and the transaction is still PENDING (or PROCESSING), the endpoint holds
+        the connection until the transaction is processed or the given amount of seconds passes. The waiting request
+        holds a server thread, so the wait is capped by TRANSACTION_WAIT_MAX and the client has to ask again after it.
         Required params:
         - transaction_id: strin
+        Optional params:
+        - wait: number (seconds, TRANSACTION_WAIT_MAX at most)
         :param request:
         :return: status: string
         """
@@ -24,4 +31,11 @@ class TransactionViewSet(viewsets.ModelViewSet):
         transaction_id = self.request.query_params.get('transaction_id')
         transaction = Transaction.objects.get(id=transaction_id)
 
+        # Wait for the payment worker to notify about the new status
+        wait = float(self.request.query_params.get('wait', 0))
+        if wait > 0 and transaction.status in ('PENDING', 'PROCESSING'):
+            status = wait_for_transaction_status(transaction.id, min(wait, settings.TRANSACTION_WAIT_MAX))
+            if status is not None:
+                return JsonResponse(status)
+
         return JsonResponse({"status": transaction.status, "transaction_error": transaction.error_type})
@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import OrderedTicket, TicketType
+from .models import OrderedTicket, TicketType, TicketSales
 
 # Register your models here.
 admin.site.register(OrderedTicket)
 admin.site.register(TicketType)
+admin.site.register(TicketSales)
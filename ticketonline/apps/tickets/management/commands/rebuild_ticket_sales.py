@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from ticketonline.apps.tickets.utils.sales import rebuild_ticket_sales
+
+
+class Command(BaseCommand):
+    help = "Counts the ticket sales statistics from scratch based on all the COMPLETED reservations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', action='append', dest='event_ids', metavar='EVENT_ID',
+                            help="Rebuild statistics of this event only (can be used multiple times)")
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_ticket_sales(options['event_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics of {rebuilt} ticket types"))
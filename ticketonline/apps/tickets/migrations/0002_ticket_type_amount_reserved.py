@@ -0,0 +1,34 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_reserved_tickets(apps, schema_editor):
+    """
+    Fill the reserved tickets counters with the tickets already held by PENDING and COMPLETED reservations.
+    """
+    TicketType = apps.get_model('tickets', 'TicketType')
+    OrderedTicket = apps.get_model('tickets', 'OrderedTicket')
+
+    reserved = OrderedTicket.objects.filter(reservation__status__in=('PENDING', 'COMPLETED')) \
+        .values('event_id', 'type').annotate(amount=Count('id'))
+
+    for row in reserved:
+        TicketType.objects.filter(event_id=row['event_id'], type=row['type']).update(amount_reserved=row['amount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tickettype',
+            name='amount_reserved',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_reserved_tickets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:01
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_ordered_tickets(apps, schema_editor):
+    """
+    Merge the tickets of the same type and price ordered with one reservation into a single line.
+    """
+    OrderedTicket = apps.get_model('tickets', 'OrderedTicket')
+
+    lines = OrderedTicket.objects.values('reservation_id', 'type', 'price') \
+        .annotate(amount=Count('id')).filter(amount__gt=1)
+
+    for line in lines:
+        tickets = OrderedTicket.objects.filter(reservation_id=line['reservation_id'], type=line['type'],
+                                               price=line['price'])
+        # Keep the first ticket as the line and remove the rest
+        line_id = tickets.values_list('id', flat=True).first()
+        OrderedTicket.objects.filter(id=line_id).update(quantity=line['amount'])
+        tickets.exclude(id=line_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0002_ticket_type_amount_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderedticket',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(merge_ordered_tickets, migrations.RunPython.noop),
+    ]
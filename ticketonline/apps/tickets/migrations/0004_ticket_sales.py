@@ -0,0 +1,45 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:03
+
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def count_ticket_sales(apps, schema_editor):
+    """
+    Fill the statistics with the tickets already bought with COMPLETED reservations.
+    """
+    TicketType = apps.get_model('tickets', 'TicketType')
+    TicketSales = apps.get_model('tickets', 'TicketSales')
+    OrderedTicket = apps.get_model('tickets', 'OrderedTicket')
+
+    sold_tickets = {(row['event_id'], row['type']): row['sold'] for row in
+                    OrderedTicket.objects.filter(reservation__status='COMPLETED')
+                    .values('event_id', 'type').annotate(sold=Sum('quantity'))}
+
+    TicketSales.objects.bulk_create([
+        TicketSales(ticket_type_id=ticket_type.id, sold=sold_tickets.get((ticket_type.event_id, ticket_type.type), 0))
+        for ticket_type in TicketType.objects.all()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0003_ordered_ticket_quantity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketSales',
+            fields=[
+                ('ticket_type', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='tickets.TicketType')),
+                ('sold', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Ticket sales',
+                'verbose_name_plural': 'Ticket sales',
+            },
+        ),
+        migrations.RunPython(count_ticket_sales, migrations.RunPython.noop),
+    ]
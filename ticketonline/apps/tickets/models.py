@@ -24,13 +24,19 @@ class TicketType(TicketModel):
     Class stores the data related to ticket type assigned to particular event.
     Class atrributes:
     - amount - the amount of tickets of current type released for particular event
+    - amount_reserved - the amount of tickets held by PENDING or bought with COMPLETED reservations
     - amount_left - the amount of tickets available to be sold
     - event - the event to which tickets refer to
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     amount = models.PositiveIntegerField()
+    amount_reserved = models.PositiveIntegerField(default=0)
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="ticket_types")
 
+    @property
+    def amount_left(self):
+        return self.amount - self.amount_reserved
+
     def __str__(self):
         return f"${self.event.name} - {self.type} (${self.price} EUR). Amount released: {self.amount}"
 
@@ -41,18 +47,41 @@ class TicketType(TicketModel):
 
 class OrderedTicket(TicketModel):
     """
-    Class stores the data related to ticket ordered by the User.
+    Class stores the data related to tickets ordered by the User.
+    Every row is a single line of the reservation which holds all the tickets of one type.
     Class attributes:
+    - quantity - the amount of tickets of this type ordered with the reservation
     - reservation - the reservation made by user for particular event. The ticket is assigned to one reservation.
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    quantity = models.PositiveIntegerField(default=1)
     reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, related_name="tickets")
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="tickets_ordered")
 
     def __str__(self):
-        return f"${self.type} ${self.price} EUR. Status: ${self.reservation.status}. " \
+        return f"${self.quantity} x ${self.type} ${self.price} EUR. Status: ${self.reservation.status}. " \
                f"Event: {self.reservation.event.name}."
 
     class Meta:
         verbose_name = "Ordered ticket"
         verbose_name_plural = "Ordered tickets"
+
+
+class TicketSales(models.Model):
+    """
+    Class stores the statistics of tickets sold for particular ticket type.
+    Statistics are updated every time a reservation is paid so they do not have to be counted on every request.
+    They can be counted from scratch with rebuild_ticket_sales command.
+    Class attributes:
+    - ticket_type - the ticket type the statistics refer to
+    - sold - the amount of tickets of this type bought with COMPLETED reservations
+    """
+    ticket_type = models.OneToOneField(TicketType, on_delete=models.CASCADE, primary_key=True, related_name="sales")
+    sold = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.ticket_type.event.name} - {self.ticket_type.type}. Sold: {self.sold}"
+
+    class Meta:
+        verbose_name = "Ticket sales"
+        verbose_name_plural = "Ticket sales"
@@ -1,5 +1,6 @@
 from .models import OrderedTicket, TicketType
 from rest_framework import serializers
+from ticketonline.serialization import RowSerializer
 
 
 class OrderedTicketSerializer(serializers.ModelSerializer):
@@ -12,3 +13,8 @@ class TicketTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = TicketType
         fields = '__all__'
+
+
+# Fast serializers of the read endpoints producing the same output as the ones above
+ordered_ticket_row_serializer = RowSerializer(OrderedTicketSerializer)
+ticket_type_row_serializer = RowSerializer(TicketTypeSerializer)
@@ -0,0 +1,123 @@
+import operator
+from functools import reduce
+from django.db.models import F, Q, Sum, Case, When, Value, IntegerField
+from django.db.models.functions import Greatest
+from ticketonline.apps.events.models import Reservation
+from ticketonline.apps.events.availability import invalidate_ticket_availability
+from ticketonline.apps.tickets.models import TicketType, OrderedTicket
+from ticketonline.apps.tickets.utils.sales import record_ticket_sales
+
+
+class InsufficientTickets(Exception):
+    pass
+
+
+def reserve_tickets(event_tickets, ordered_tickets):
+    """
+    Function holds the ordered tickets by increasing reserved counters of the ticket types.
+    Rows of the ordered ticket types are locked in the order of their ids (so two concurrent orders can not deadlock),
+    checked and then all the counters are changed with a single UPDATE, so two concurrent orders can never sell
+    the same tickets. Nothing is changed when any of the ticket types is sold out.
+    It has to be called inside transaction.atomic().
+    :param event_tickets: dictionary with ticket type name as a key and TicketType object as a value
+    :param ordered_tickets: list of ordered tickets (example: [{"type":"VIP", "amount":3}])
+    :raises InsufficientTickets: when there are not enough tickets of some type, with the type as an argument
+    :return: True if any of the ordered ticket types is sold out now
+    """
+    # Amount of ordered tickets by ticket type id
+    amounts = dict()
+    for ticket in ordered_tickets:
+        if ticket['amount'] > 0:
+            ticket_type = event_tickets[ticket['type']]
+            amounts[ticket_type.id] = amounts.get(ticket_type.id, 0) + ticket['amount']
+
+    if not amounts:
+        return False
+
+    # Amount of tickets left by ticket type id
+    left = {ticket_type_id: amount - amount_reserved for ticket_type_id, amount, amount_reserved in
+            TicketType.objects.select_for_update().filter(id__in=amounts.keys()).order_by('id')
+            .values_list('id', 'amount', 'amount_reserved')}
+
+    for ticket_type in sorted(event_tickets.values(), key=lambda t: t.type):
+        if ticket_type.id in amounts and left.get(ticket_type.id, 0) < amounts[ticket_type.id]:
+            raise InsufficientTickets(ticket_type.type)
+
+    ordered_amount = Case(*[When(id=ticket_type_id, then=Value(amount)) for ticket_type_id, amount in amounts.items()],
+                          output_field=IntegerField())
+    TicketType.objects.filter(id__in=amounts.keys()).update(amount_reserved=F('amount_reserved') + ordered_amount)
+
+    return any(left[ticket_type_id] == amount for ticket_type_id, amount in amounts.items())
+
+
+def release_tickets(reservation_ids):
+    """
+    Function gives the tickets held by given reservations back to the pool of tickets available to be sold.
+    Counters of all the ticket types are changed with a single UPDATE.
+    :param reservation_ids: list of ids of reservations which do not hold their tickets anymore
+    """
+    held_tickets = list(OrderedTicket.objects.filter(reservation_id__in=reservation_ids)
+                        .values('event_id', 'type').annotate(amount=Sum('quantity')))
+
+    if not held_tickets:
+        return
+
+    held_amount = Case(*[When(event_id=held['event_id'], type=held['type'], then=Value(held['amount']))
+                         for held in held_tickets], default=Value(0), output_field=IntegerField())
+
+    held_types = TicketType.objects.filter(
+        reduce(operator.or_, [Q(event_id=held['event_id'], type=held['type']) for held in held_tickets]))
+
+    # Events with sold out ticket types which become available again
+    sold_out_event_ids = set(held_types.filter(amount_reserved__gte=F('amount'))
+                             .values_list('event_id', flat=True).distinct())
+
+    held_types.update(amount_reserved=Greatest(F('amount_reserved') - held_amount, 0))
+
+    # Amounts of tickets left have changed
+    event_ids = {held['event_id'] for held in held_tickets}
+    invalidate_ticket_availability(event_ids - sold_out_event_ids)
+    if sold_out_event_ids:
+        invalidate_ticket_availability(sold_out_event_ids, touch=True)
+
+
+def cancel_reservations(reservation_ids):
+    """
+    Function changes status of PENDING reservations to CANCELLED and releases their tickets.
+    Reservations which are not PENDING anymore (already paid or cancelled) are left untouched, so the tickets
+    are never released twice. It has to be called inside transaction.atomic().
+    :param reservation_ids: list of ids of reservations to cancel
+    :return: list of ids of reservations which were actually cancelled
+    """
+    # Lock pending reservations so they can not be paid in the meantime
+    pending_ids = list(Reservation.objects.select_for_update()
+                       .filter(id__in=reservation_ids, status='PENDING').values_list('id', flat=True))
+
+    if pending_ids:
+        Reservation.objects.filter(id__in=pending_ids).update(status='CANCELLED')
+        release_tickets(pending_ids)
+
+    return pending_ids
+
+
+def complete_reservations(reservation_ids):
+    """
+    Function changes status of paid PENDING reservations to COMPLETED and adds their tickets to the sales statistics.
+    Reservations which are not PENDING anymore (expired or cancelled) are left untouched.
+    It has to be called inside transaction.atomic().
+    :param reservation_ids: list of ids of the paid reservations
+    :return: list of ids of reservations which were actually completed
+    """
+    # Lock pending reservations so they can not expire in the meantime
+    pending = list(Reservation.objects.select_for_update()
+                   .filter(id__in=reservation_ids, status='PENDING').values_list('id', 'event_id'))
+    pending_ids = [reservation_id for reservation_id, event_id in pending]
+
+    if pending_ids:
+        Reservation.objects.filter(id__in=pending_ids).update(status='COMPLETED')
+        record_ticket_sales(pending_ids)
+
+        # Tickets are sold now, they were already counted as not available when they were reserved
+        invalidate_ticket_availability([event_id for reservation_id, event_id in pending])
+
+    return pending_ids
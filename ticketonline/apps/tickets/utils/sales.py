@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models import F, Sum
+from ticketonline.apps.tickets.models import TicketType, TicketSales, OrderedTicket
+
+
+def record_ticket_sales(reservation_ids):
+    """
+    Function adds the tickets of given reservations to the ticket sales statistics.
+    It has to be called exactly once for every reservation, right after it is COMPLETED.
+    :param reservation_ids: list of ids of the paid reservations
+    """
+    sold_tickets = OrderedTicket.objects.filter(reservation_id__in=reservation_ids) \
+        .values('event_id', 'type').annotate(amount=Sum('quantity'))
+
+    for sold in sold_tickets:
+        ticket_type_id = TicketType.objects.filter(event_id=sold['event_id'], type=sold['type']) \
+            .values_list('id', flat=True).first()
+        if ticket_type_id is None:
+            continue
+
+        # Create the statistics on the first sale and increase them atomically
+        TicketSales.objects.get_or_create(ticket_type_id=ticket_type_id)
+        TicketSales.objects.filter(ticket_type_id=ticket_type_id).update(sold=F('sold') + sold['amount'])
+
+
+def rebuild_ticket_sales(event_ids=None):
+    """
+    Function counts the ticket sales statistics from scratch based on all the COMPLETED reservations.
+    :param event_ids: list of ids of the events to rebuild the statistics for, all the events if None
+    :return: number of ticket types which statistics were rebuilt
+    """
+    ticket_types = TicketType.objects.all()
+    ordered_tickets = OrderedTicket.objects.filter(reservation__status='COMPLETED')
+    if event_ids is not None:
+        ticket_types = ticket_types.filter(event_id__in=event_ids)
+        ordered_tickets = ordered_tickets.filter(event_id__in=event_ids)
+
+    # Count tickets sold of each type of each event with a single grouped query
+    sold_tickets = {(row['event_id'], row['type']): row['sold'] for row in
+                    ordered_tickets.values('event_id', 'type').annotate(sold=Sum('quantity'))}
+
+    new_sales = [
+        TicketSales(ticket_type_id=ticket_type['id'],
+                    sold=sold_tickets.get((ticket_type['event_id'], ticket_type['type']), 0))
+        for ticket_type in ticket_types.values('id', 'event_id', 'type')
+    ]
+
+    # Replace old statistics with the new ones at once
+    with transaction.atomic():
+        TicketSales.objects.filter(ticket_type__in=ticket_types).delete()
+        TicketSales.objects.bulk_create(new_sales)
+
+    return len(new_sales)
@@ -0,0 +1,42 @@
+import time
+from django.conf import settings
+from django.db import connections
+
+
+def check_connection(connection, now):
+    """
+    Function closes the persistent connection if it does not work anymore (e.g. the database was restarted),
+    so it is reopened by the first query. Connections used recently are not checked.
+    :param connection: database connection wrapper
+    :param now: current time (time.monotonic())
+    """
+    if connection.connection is None or connection.in_atomic_block:
+        return
+
+    last_used = getattr(connection, 'last_used', None)
+    if last_used is not None and now - last_used < settings.CONN_HEALTH_CHECK_INTERVAL:
+        return
+
+    if not connection.is_usable():
+        connection.close()
+
+
+class DatabaseHealthCheckMiddleware:
+    """
+    Middleware checking the persistent database connections (CONN_MAX_AGE) of the thread before the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        now = time.monotonic()
+        for connection in connections.all():
+            check_connection(connection, now)
+
+        try:
+            return self.get_response(request)
+        finally:
+            now = time.monotonic()
+            for connection in connections.all():
+                connection.last_used = now
@@ -0,0 +1,93 @@
+import contextvars
+import random
+from functools import wraps
+from django.conf import settings
+
+# State of the request handled by the current thread
+_request_state = contextvars.ContextVar('replica_request_state', default=None)
+
+
+class ReplicaRequestState:
+    """
+    Keeps the database chosen for the reads of the request and whether the request wrote anything.
+    - pinned - the client wrote recently, so it reads from the primary database to see its own writes
+    - replica - alias of the replica used by the reads, None when reading from the primary database
+    - wrote - whether the request used the primary database for writing
+    """
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica = None
+        self.wrote = False
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads of the views marked with read_from_replica to one of DATABASE_REPLICAS.
+    All the writes and all the other reads go to the primary (default) database.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and state.replica is not None:
+            return state.replica
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas contain the same data as the primary database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are migrated through the replication of the primary database
+        return db not in settings.DATABASE_REPLICAS
+
+
+def read_from_replica(view_method):
+    """
+    Decorator of the read-only view methods which can read from a replica.
+    Clients which wrote recently keep reading from the primary database.
+    """
+
+    @wraps(view_method)
+    def wrapper(*args, **kwargs):
+        state = _request_state.get()
+        if state is None or state.pinned or not settings.DATABASE_REPLICAS:
+            return view_method(*args, **kwargs)
+
+        state.replica = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            return view_method(*args, **kwargs)
+        finally:
+            state.replica = None
+
+    return wrapper
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Middleware pinning the clients which wrote anything to the primary database for REPLICA_STICKINESS_SECONDS
+    with a cookie, so they see their own writes even when the replicas are behind.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = ReplicaRequestState(pinned=settings.REPLICA_STICKINESS_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(settings.REPLICA_STICKINESS_COOKIE, '1', max_age=settings.REPLICA_STICKINESS_SECONDS,
+                                httponly=True, samesite='Lax')
+
+        return response
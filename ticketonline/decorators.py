@@ -1,9 +1,6 @@
-import datetime
 import logging
 from django.http import JsonResponse
-
-now = datetime.datetime.now().strftime("%d-%m-%Y")
-logging.basicConfig(filename=f'logs/{now}.log', format='%(asctime)s:%(levelname)s:%(message)s\n')
+from .metrics import record_handled_error
 
 
 def log_exceptions(info):
@@ -19,6 +16,8 @@ def log_exceptions(info):
             except Exception as e:
                 print(f'Exception in function: {func.__name__}\n{e}')
                 logging.warning(e, exc_info=True)
+                # Count the error even though the client gets a regular response
+                record_handled_error(type(args[0]).__name__ if args else func.__module__, func.__name__)
                 return JsonResponse({"error": "Could not process request", "message": info})
 
         return wrapper
@@ -0,0 +1,75 @@
+"""
+Gunicorn configuration of the production server.
+Usage: gunicorn -c python:ticketonline.gunicornconfig ticketonline.wsgi:application
+
+All the values can be changed with environment variables:
+- GUNICORN_BIND - address to listen on (0.0.0.0:8000 by default)
+- GUNICORN_WORKERS - amount of worker processes (2 * CPU count + 1 by default, at most 8)
+- GUNICORN_WORKER_CLASS - sync, gthread (default) or gevent (requires gevent and psycogreen packages)
+- GUNICORN_THREADS - amount of threads of each gthread worker (4 by default)
+- GUNICORN_TIMEOUT - seconds after which a silent worker is restarted (30 by default)
+- GUNICORN_MAX_REQUESTS - amount of requests after which a worker is restarted (0 - never by default)
+
+Every worker thread keeps its own persistent database connection (CONN_MAX_AGE), so workers * threads
+(32 with the default values) plus the connections of celery workers has to stay below max_connections of the database
+(100 by default on PostgreSQL). Greenlets of gevent workers are created for every request, so their connections
+could never be reused - CONN_MAX_AGE is forced to 0 for gevent, use a pooler like pgbouncer to reuse the connections.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+# Default amount of workers is capped, so the persistent database connections of a large machine do not exceed
+# max_connections of the database
+workers = int(os.environ.get('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+# Load the application once in the master process, workers are forked with the application already imported.
+# gevent has to patch the standard library before the application is imported, so it loads the application
+# in every worker
+preload_app = worker_class != 'gevent'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+if worker_class == 'gevent':
+    try:
+        import gevent  # noqa: F401
+        import psycogreen.gevent  # noqa: F401
+    except ImportError:
+        raise RuntimeError("gevent worker class requires gevent and psycogreen packages")
+
+    # Connection of a greenlet is never reused by the following requests, it would stay open until CONN_MAX_AGE
+    # passes (settings are loaded in the workers, after this module)
+    os.environ['CONN_MAX_AGE'] = '0'
+
+
+def pre_fork(server, worker):
+    if not preload_app:
+        return
+
+    # Database connections opened while loading the application in the master process
+    # must not be shared by the workers
+    from django.db import connections
+    for connection in connections.all():
+        connection.close()
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        # Let other greenlets run while waiting for the database
+        import psycogreen.gevent
+        psycogreen.gevent.patch_psycopg()
+
+
+def child_exit(server, worker):
+    # Remove metrics of the worker which exited (see ticketonline.metrics)
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
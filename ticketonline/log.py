@@ -0,0 +1,99 @@
+import atexit
+import fcntl
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+
+class SharedRotatingFileHandler(WatchedFileHandler):
+    """
+    File handler rotating the file when it exceeds max_bytes, keeping only backup_count old files.
+    Many processes can append to the same file - the first one which notices the file is too large rotates it
+    while holding an exclusive lock of <filename>.lock, the others reopen the new file when they write next time.
+    """
+
+    def __init__(self, filename, max_bytes, backup_count, encoding=None):
+        super().__init__(filename, encoding=encoding, delay=True)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.lock_filename = self.baseFilename + '.lock'
+
+    def file_size(self):
+        try:
+            return os.stat(self.baseFilename).st_size
+        except FileNotFoundError:
+            return 0
+
+    def rotate(self):
+        with open(self.lock_filename, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Other process could rotate the file while this one was waiting for the lock
+                if self.file_size() < self.max_bytes:
+                    return
+
+                for number in range(self.backup_count - 1, 0, -1):
+                    backup = f"{self.baseFilename}.{number}"
+                    if os.path.exists(backup):
+                        os.replace(backup, f"{self.baseFilename}.{number + 1}")
+                if self.backup_count > 0:
+                    os.replace(self.baseFilename, f"{self.baseFilename}.1")
+                else:
+                    os.remove(self.baseFilename)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def emit(self, record):
+        if self.max_bytes > 0 and self.file_size() >= self.max_bytes:
+            self.rotate()
+        # File moved away by this or other process is reopened
+        super().emit(record)
+
+
+class ListenerQueueHandler(QueueHandler):
+    """
+    Handler putting the log records on a queue read by a background thread, which appends them to the file.
+    Threads which log never wait for the disk.
+    After a fork (celery or gunicorn workers) the child process starts its own background thread.
+    All the processes append to the same file, which is rotated when it exceeds max_bytes (see
+    SharedRotatingFileHandler), only backup_count old files are kept.
+    """
+
+    def __init__(self, filename, max_bytes, backup_count, log_format=None):
+        super().__init__(queue.SimpleQueue())
+
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.file_handler = SharedRotatingFileHandler(filename, max_bytes, backup_count, encoding='utf-8')
+        self.file_handler.setFormatter(logging.Formatter(log_format))
+
+        self.listener = None
+        self.start_listener()
+
+        atexit.register(self.stop_listener)
+        os.register_at_fork(after_in_child=self.restart_listener)
+
+    def start_listener(self):
+        self.listener = QueueListener(self.queue, self.file_handler, respect_handler_level=True)
+        self.listener.start()
+
+    def stop_listener(self):
+        """
+        Writes all the records left in the queue and stops the background thread.
+        """
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+        self.file_handler.close()
+
+    def restart_listener(self):
+        # Background thread of the parent process does not exist in the child, the records left in the queue
+        # are written by the parent
+        self.queue = queue.SimpleQueue()
+        self.start_listener()
+
+    def close(self):
+        self.stop_listener()
+        super().close()
@@ -0,0 +1,114 @@
+import os
+import time
+from contextlib import ExitStack
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+
+# When PROMETHEUS_MULTIPROC_DIR environment variable is set, every worker process writes its metrics
+# to its own files in this directory and /metrics endpoint sums the values of all the workers.
+# The directory has to be emptied before the server starts.
+
+REQUESTS = Counter('ticketonline_requests_total', "Requests handled by the views",
+                   ['view', 'action', 'method', 'status'])
+REQUEST_LATENCY = Histogram('ticketonline_request_duration_seconds', "Time spent on handling the requests",
+                            ['view', 'action'],
+                            buckets=(.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 10.0, 30.0))
+DB_QUERIES = Counter('ticketonline_db_queries_total', "SQL queries executed while handling the requests",
+                     ['view', 'action'])
+DB_TIME = Counter('ticketonline_db_query_duration_seconds_total', "Time spent on SQL queries of the requests",
+                  ['view', 'action'])
+ERRORS = Counter('ticketonline_errors_total', "Exceptions raised by the views. Kind is handled for the exceptions "
+                                              "turned into error responses by log_exceptions",
+                 ['view', 'action', 'kind'])
+
+
+def view_labels(view_func, method):
+    """
+    Function returns the view and action labels for the resolved view.
+    DRF viewsets are labelled with the class name and the action the method is mapped to (list, create...).
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown'), method.lower()
+
+    actions = getattr(view_func, 'actions', None) or {}
+    return view_class.__name__, actions.get(method.lower(), method.lower())
+
+
+def record_handled_error(view, action):
+    """
+    Function counts the exception which was caught and turned into an error response.
+    """
+    ERRORS.labels(view, action, 'handled').inc()
+
+
+class QueryTimer:
+    """
+    Database execute wrapper counting the queries and the time spent on them.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """
+    Middleware recording amount of requests, latency, SQL queries and exceptions of every view.
+    Requests which do not match any view are not recorded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+
+        labels = getattr(request, 'metrics_labels', None)
+        if labels is not None:
+            REQUESTS.labels(*labels, request.method, response.status_code).inc()
+            REQUEST_LATENCY.labels(*labels).observe(time.perf_counter() - started)
+            DB_QUERIES.labels(*labels).inc(timer.queries)
+            DB_TIME.labels(*labels).inc(timer.duration)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if view_func is not metrics_view:
+            request.metrics_labels = view_labels(view_func, request.method)
+
+    def process_exception(self, request, exception):
+        labels = getattr(request, 'metrics_labels', None)
+        if labels is not None:
+            ERRORS.labels(*labels, 'unhandled').inc()
+
+
+def metrics_view(request):
+    """
+    Endpoint returns all the metrics in Prometheus text format.
+    :param request:
+    :return: metrics of all the worker processes
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
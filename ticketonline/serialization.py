@@ -0,0 +1,138 @@
+import json
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import serializers
+
+# Optional faster JSON encoder, responses are encoded with the standard json module without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_datetime(value, tz):
+    """
+    Function formats the datetime exactly like DRF DateTimeField with the default ISO 8601 format.
+    """
+    if tz is not None:
+        value = value.astimezone(tz) if timezone.is_aware(value) else timezone.make_aware(value, tz)
+    elif timezone.is_aware(value):
+        value = timezone.make_naive(value, timezone.utc)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def encode_value(value, tz):
+    return value
+
+
+# Encoders for the DRF fields generated by ModelSerializer for the models of the application
+# Every encoder returns exactly the value DRF field would return, converted to a type JsonResponse writes the same way
+FIELD_ENCODERS = [
+    (serializers.UUIDField, lambda value, tz: str(value)),
+    (serializers.DateTimeField, encode_datetime),
+    (serializers.FloatField, lambda value, tz: float(value)),
+    (serializers.IntegerField, lambda value, tz: int(value)),
+    (serializers.BooleanField, lambda value, tz: bool(value)),
+    (serializers.ChoiceField, encode_value),
+    (serializers.CharField, lambda value, tz: str(value)),
+    (serializers.PrimaryKeyRelatedField, lambda value, tz: str(value)),
+]
+
+
+class RowSerializer:
+    """
+    Fast read-only replacement of a ModelSerializer working on rows fetched with QuerySet.values().
+    The fields, their order and their encoders are read from the ModelSerializer once, so serializing a row
+    does not create model objects nor DRF fields. Output is the same as the output of the ModelSerializer.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self._fields = None
+
+    @property
+    def fields(self):
+        """
+        List of tuples (output name, column name, encoder) compiled from the ModelSerializer fields.
+        """
+        if self._fields is None:
+            model = self.serializer_class.Meta.model
+            fields = []
+            for name, field in self.serializer_class().fields.items():
+                if field.write_only:
+                    continue
+
+                encoder = next((encoder for field_class, encoder in FIELD_ENCODERS
+                                if isinstance(field, field_class)), None)
+                if encoder is None:
+                    raise TypeError(f"Field {name} of {self.serializer_class.__name__} "
+                                    f"({type(field).__name__}) is not supported by RowSerializer")
+
+                # Related objects are represented by the value of their foreign key
+                column = model._meta.get_field(field.source).attname if field.source != '*' else name
+                fields.append((name, column, encoder))
+
+            self._fields = fields
+        return self._fields
+
+    @property
+    def columns(self):
+        return [column for name, column, encoder in self.fields]
+
+    def values(self, queryset):
+        """
+        Method fetches only the columns of the serialized fields as dictionaries.
+        """
+        return queryset.values(*self.columns)
+
+    def related_columns(self, relation):
+        """
+        Method returns the columns of the serialized fields fetched through a relation (e.g. event__name),
+        so the related object can be read in the same query.
+        """
+        return [f'{relation}__{column}' for column in self.columns]
+
+    def current_timezone(self):
+        return timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def serialize(self, row, tz=None):
+        """
+        Method serializes a single row fetched with values() or a model object.
+        """
+        tz = tz or self.current_timezone()
+        if not isinstance(row, dict):
+            row = {column: getattr(row, column) for name, column, encoder in self.fields}
+
+        return {name: encoder(row[column], tz) if row[column] is not None else None
+                for name, column, encoder in self.fields}
+
+    def serialize_related(self, row, relation, tz=None):
+        """
+        Method serializes the related object from a row fetched with related_columns().
+        """
+        return self.serialize({column: row[f'{relation}__{column}'] for column in self.columns}, tz)
+
+    def serialize_many(self, rows):
+        tz = self.current_timezone()
+        return [self.serialize(row, tz) for row in rows]
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    JsonResponse of the read endpoints encoding the data with orjson when it is installed (and FAST_JSON_ENCODER
+    is enabled), otherwise with the standard json module exactly like JsonResponse.
+    orjson writes the same data without spaces between the items and without escaping non-ASCII characters.
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        if orjson is not None and settings.FAST_JSON_ENCODER:
+            content = orjson.dumps(data)
+        else:
+            content = json.dumps(data, cls=DjangoJSONEncoder)
+        super().__init__(content=content, **kwargs)
@@ -1,46 +1,17 @@
 from .celery import app
 import datetime
 import logging
-import os
+import time
+from django.conf import settings
 from ticketonline.apps.events.models import Reservation
+from ticketonline.apps.events.archive import archive_reservations
+from ticketonline.apps.tickets.utils.inventory import cancel_reservations
+from django.db import transaction
 from datetime import timedelta
 import pytz
 
-now = datetime.datetime.now().strftime("%d-%m-%Y")
-logging.basicConfig(filename='logs/{now}.log', format='%(asctime)s:%(levelname)s:%(message)s\n')
-
-
-@app.task
-def clean_old_logs():
-    """
-    Task is responsible for cleaning (deleting) old files with logs.
-    If there are more than MAX_FILES, the oldest file is being deleted until the amount
-    of log files is proper.
-    :return:
-    """
-    try:
-        # Remove general logs older than 60 days
-        directory = 'logs/'
-        files = os.listdir(f'{directory}')
-        MAX_FILES = 60
-
-        if len(files) > MAX_FILES:
-            while len(files) > MAX_FILES:
-                oldest_file = files[0]
-                smallest_timestamp = os.path.getmtime(f'{directory}{oldest_file}')
-
-                for _file in files:
-                    timestamp = os.path.getmtime(f'{directory}{_file}')
-                    if timestamp < smallest_timestamp:
-                        smallest_timestamp = timestamp
-                        oldest_file = _file
-
-                os.remove(f'{directory}{oldest_file}')
-                files = os.listdir(f'{directory}')
-
-    except Exception as e:
-        print(e)
-        logging.warning(e, exc_info=True)
+# Progress of the periodic tasks is logged at INFO level (see LOGGING setting)
+logger = logging.getLogger(__name__)
 
 
 @app.task
@@ -48,18 +19,31 @@ def reservation_expired():
     """
     Task is a worker which checks every minute whether there are any expired reservations with PENDING status
     and if so, it changes reservation status to CANCELLED.
-    :return:
+    Expired reservations are cancelled in batches of RESERVATION_EXPIRY_BATCH_SIZE, each in its own short transaction.
+    :return: dictionary with the amount of expired reservations and duration of the task in seconds
     """
     try:
-        # Get all pending reservations and current datetime
-        pending_reservations = Reservation.objects.filter(status="PENDING")
+        started = time.monotonic()
         now = datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
+        batch_size = settings.RESERVATION_EXPIRY_BATCH_SIZE
+        expired = 0
+
+        while True:
+            with transaction.atomic():
+                # Find the next batch of pending reservations which 15 minutes buffer has already passed
+                batch = list(Reservation.objects.filter(status="PENDING", pending_until__lt=now)
+                             .values_list('id', flat=True)[:batch_size])
+
+                # Cancelling gives the held tickets back to the pool
+                expired += len(cancel_reservations(batch))
+
+            if len(batch) < batch_size:
+                break
+
+        duration = time.monotonic() - started
+        logger.info(f"Expired {expired} reservations in {duration:.3f}s")
 
-        # Iterate over reservations and change their status if 15 minutes buffer has already passed
-        for reservation in pending_reservations:
-            if reservation.pending_until < now:
-                reservation.status = "CANCELLED"
-                reservation.save()
+        return {"expired": expired, "duration": duration}
     except Exception as e:
         print(e)
         logging.warning(e, exc_info=True)
@@ -68,18 +52,18 @@ def reservation_expired():
 @app.task
 def remove_old_reservations():
     """
-    Task removes reservations older than 100 days.
-    :return:
+    Task moves reservations older than RESERVATION_RETENTION_DAYS (100 days by default) to the archive files
+    stored in RESERVATION_ARCHIVE_DIR.
+    :return: amount of archived reservations
     """
     try:
-        reservations = Reservation.objects.all()
         now = datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
 
-        for reservation in reservations:
-            if reservation.reservation_date < now - timedelta(days=100):
-                # Remove reservations older than 100 days
-                reservation.delete()
+        archived = archive_reservations(now - timedelta(days=settings.RESERVATION_RETENTION_DAYS),
+                                        settings.RESERVATION_ARCHIVE_DIR, settings.RESERVATION_ARCHIVE_CHUNK_SIZE)
+        logger.info(f"Archived {archived} reservations")
 
+        return archived
     except Exception as e:
         print(e)
         logging.warning(e, exc_info=True)
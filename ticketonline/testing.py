@@ -0,0 +1,97 @@
+from contextlib import ExitStack
+from django.db import connections
+
+
+class RowCountingCursor:
+    """
+    Wraps DB-API cursor and counts the rows fetched from it.
+    """
+
+    def __init__(self, cursor, counter):
+        self.cursor = cursor
+        self.counter = counter
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.counter.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self.cursor.fetchmany(*args, **kwargs)
+        self.counter.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.counter.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self.cursor:
+            self.counter.rows += 1
+            yield row
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+
+class QueryCounter:
+    """
+    Context manager which counts SQL queries executed on all the database connections
+    and the rows fetched by them.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.rows = 0
+        self.stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        result = execute(sql, params, many, context)
+        # Count the rows read from the database driver cursor
+        if not isinstance(context['cursor'].cursor, RowCountingCursor):
+            context['cursor'].cursor = RowCountingCursor(context['cursor'].cursor, self)
+        return result
+
+    def __enter__(self):
+        self.stack = ExitStack()
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin checking that a block of code stays within the budget of SQL queries and fetched rows.
+    """
+
+    def assertQueryBudget(self, max_queries, max_rows, name=None):
+        return QueryBudgetContext(self, max_queries, max_rows, name)
+
+
+class QueryBudgetContext(QueryCounter):
+
+    def __init__(self, test_case, max_queries, max_rows, name=None):
+        super().__init__()
+        self.test_case = test_case
+        self.max_queries = max_queries
+        self.max_rows = max_rows
+        self.name = name or "code block"
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+
+        executed = "\n".join(f"{i}. {sql}" for i, sql in enumerate(self.queries, start=1))
+        self.test_case.assertLessEqual(
+            len(self.queries), self.max_queries,
+            f"{self.name} executed {len(self.queries)} queries, budget is {self.max_queries}:\n{executed}")
+        self.test_case.assertLessEqual(
+            self.rows, self.max_rows,
+            f"{self.name} fetched {self.rows} rows, budget is {self.max_rows}:\n{executed}")
@@ -16,9 +16,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls import url
+from ticketonline.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     url(r'^events/', include('ticketonline.apps.events.urls')),
     url(r'^transactions/', include('ticketonline.apps.payments.urls')),
+    path('metrics', metrics_view),
 ]